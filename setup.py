@@ -6,7 +6,7 @@ setup(
     version='1.0',
     py_modules=['templater'],
     install_requires=[
-        'click', 'jinja2', 'configparser', 'wheel'
+        'click', 'jinja2', 'configparser', 'wheel', 'packaging'
     ],
     entry_points='''
         [console_scripts]
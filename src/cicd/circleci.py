@@ -1,5 +1,5 @@
 import click
-from src.functions import create_template_env
+from src.render.plan import RenderPlan, add_file, execute_plan, new_plan
 import sys
 import pathlib
 
@@ -7,11 +7,13 @@ SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
 BASE_PATH = pathlib.Path.cwd()
 
 
-def create_circleci(docker: bool, ecr: bool) -> None:
-    """Creates circleci workflow
+def plan_circleci(plan: RenderPlan, docker: bool, ecr: bool) -> None:
+    """Add the circleci workflow to a render plan
     
     Parameters
     ----------
+    plan : RenderPlan
+        Plan to extend
     docker : bool
         Whether the user needs a docker environment or not
     ecr : bool
@@ -19,22 +21,32 @@ def create_circleci(docker: bool, ecr: bool) -> None:
 
     """    
     output_path = BASE_PATH.joinpath('.circleci', 'config.yml')
-    
-    env = create_template_env()
 
     if ecr:
-        template = env.get_template('config_template_ecr.yml')
+        template = 'config_template_ecr.yml'
     else:
         if docker:
-            template = env.get_template('config_template_docker_noecr.yml')
+            template = 'config_template_docker_noecr.yml'
         else:
-            template = env.get_template('config_template_noecr.yml')
+            template = 'config_template_noecr.yml'
+    
+    add_file(plan, template, output_path, {'pyversion': SYS_PY})
+
+
+def create_circleci(docker: bool, ecr: bool) -> None:
+    """Creates circleci workflow
     
-    # Render config file
-    output = template.render(pyversion=SYS_PY)
-    # Save rendered file to disk
-    with open(output_path, 'w') as file:
-        file.write(output)
+    Parameters
+    ----------
+    docker : bool
+        Whether the user needs a docker environment or not
+    ecr : bool
+        Whether the user needs AWS ECR access or not
+
+    """    
+    plan = new_plan()
+    plan_circleci(plan, docker=docker, ecr=ecr)
+    execute_plan(plan)
 
 
 
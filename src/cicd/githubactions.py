@@ -1,5 +1,5 @@
 import click
-from src.functions import create_template_env
+from src.render.plan import RenderPlan, add_file, execute_plan, new_plan
 import sys
 import pathlib
 import shutil
@@ -9,11 +9,13 @@ SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
 BASE_PATH = pathlib.Path.cwd()
 
 
-def create_github_actions(docker: bool) -> None:
-    """Create a github actions workflow
+def plan_github_actions(plan: RenderPlan, docker: bool) -> None:
+    """Add the github actions workflows to a render plan
     
     Parameters
     ----------
+    plan : RenderPlan
+        Plan to extend
     docker : bool
         User requires a docker environment
 
@@ -21,24 +23,31 @@ def create_github_actions(docker: bool) -> None:
     master_path = BASE_PATH.joinpath('.github', 'workflows', 'workflow_master.yml')
     dev_path = BASE_PATH.joinpath('.github', 'workflows', 'workflow_dev.yml')
 
-    env = create_template_env()
-    
     if docker:
-        template_master = env.get_template('workflow_master_template_docker.yml')
-        template_dev = env.get_template('workflow_dev_template_docker.yml')
+        template_master = 'workflow_master_template_docker.yml'
+        template_dev = 'workflow_dev_template_docker.yml'
     else:
-        template_master = env.get_template('workflow_master_template_nodocker.yml')
-        template_dev = env.get_template('workflow_dev_template_nodocker.yml')
+        template_master = 'workflow_master_template_nodocker.yml'
+        template_dev = 'workflow_dev_template_nodocker.yml'
     
-    # Render files, and within them render Github related secrets as Jinja will try to render them and throw an error
-    output_master = template_master.render(pyversion=SYS_PY,  codecov='${{ secrets.CODECOV_TOKEN }}', github='${{ secrets.GITHUB_TOKEN }}')
-    output_dev = template_dev.render(pyversion=SYS_PY,  codecov='${{ secrets.CODECOV_TOKEN }}', github='${{ secrets.GITHUB_TOKEN }}')
+    # Render github related secrets as themselves, Jinja would otherwise try to render them and throw an error
+    context = {'pyversion': SYS_PY, 'codecov': '${{ secrets.CODECOV_TOKEN }}', 'github': '${{ secrets.GITHUB_TOKEN }}'}
+    add_file(plan, template_master, master_path, context)
+    add_file(plan, template_dev, dev_path, context)
+
 
-    # Save rendered file to disk
-    with open(master_path, 'w') as file:
-        file.write(output_master)
-    with open(dev_path, 'w') as file:
-        file.write(output_dev)
+def create_github_actions(docker: bool) -> None:
+    """Create a github actions workflow
+    
+    Parameters
+    ----------
+    docker : bool
+        User requires a docker environment
+
+    """
+    plan = new_plan()
+    plan_github_actions(plan, docker=docker)
+    execute_plan(plan)
     
 
 @click.command()
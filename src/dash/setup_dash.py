@@ -1,47 +1,59 @@
 import click
 import sys
 import pathlib
-import subprocess as sp
-import os
 
 from src.docker.docker import create_docker
-from src.functions import squash_requirement_files, create_template_env
+from src.render.plan import RenderPlan, add_file, add_requirements, execute_plan, new_plan
 from src.virtual_environment.virtual_environment import create_poetry, create_virtualenv
 
 SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
 BASE_PATH = pathlib.Path.cwd()
 
-env = create_template_env()
 
-def create_dash(app_type: str, docker: bool, pyversion: str  = SYS_PY) -> None:
-    """Create GIS based Dash App
+def plan_dash(plan: RenderPlan, app_type: str, docker: bool, pyversion: str = SYS_PY, metrics: bool = False) -> None:
+    """Add a Dash App to a render plan
     
     Parameters
     ----------
+    plan : RenderPlan
+        Plan to extend
     app_type: str
         Specific type of dash application to create
     docker : bool
         Whether the user needs a docker environment or not
     pyversion : str
         Python version used
+    metrics : bool
+        Generate the request and database latency metrics module, served at /metrics
 
     """
-    os.makedirs(f"dash-{app_type}", exist_ok=True)
     output_path = BASE_PATH.joinpath(f"dash-{app_type}")
 
-    dash_files = [f"dash_{app_type}_requirements.txt", f"dash_{app_type}_template.py"]
+    add_file(plan, f"dash_{app_type}_template.py", output_path.joinpath(f"dash_{app_type}_template.py"), {'pyversion': pyversion})
+    add_requirements(plan, f"dash_{app_type}_requirements.txt")
+    # Copied verbatim, the module has no template variables
+    if metrics:
+        add_file(plan, 'metrics.py', output_path.joinpath('metrics.py'), {}, copy=True)
+
+
+def create_dash(app_type: str, docker: bool, pyversion: str  = SYS_PY, metrics: bool = False) -> None:
+    """Create GIS based Dash App
+    
+    Parameters
+    ----------
+    app_type: str
+        Specific type of dash application to create
+    docker : bool
+        Whether the user needs a docker environment or not
+    pyversion : str
+        Python version used
+    metrics : bool
+        Generate the request and database latency metrics module, served at /metrics
 
-    # Render config file and save rendered file to disk
-    for x in dash_files:
-        if x.endswith('.txt'):
-            output = squash_requirement_files(x)
-            with open(BASE_PATH.joinpath('requirements.txt'), "w") as file:
-                file.write(output)
-        else:
-            template = env.get_template(x)
-            output = template.render(pyversion=pyversion)
-            with open(output_path.joinpath(x), "w") as file:
-                file.write(output)
+    """
+    plan = new_plan()
+    plan_dash(plan, app_type=app_type, docker=docker, pyversion=pyversion, metrics=metrics)
+    execute_plan(plan)
 
 
 
@@ -54,7 +66,8 @@ def create_dash(app_type: str, docker: bool, pyversion: str  = SYS_PY) -> None:
 @click.option("--gis", "app_type", flag_value="gis", help="Whether to include a GIS specific dash front end app")
 @click.option('--docker', is_flag=True, prompt='Docker? Deny to use virtual environment', help='Whether to include build a docker image or not, defaults to no')
 @click.option('--poetry', is_flag=True, prompt='Poetry? Deny to use virtualenv', help='Whether to use poetry for virtual environment manager. If no, then virtualenv environment used.')
-def dash(repo: str, maintain: str, describe: str, docker: bool, poetry: bool, app_type: str = "basic") -> None:
+@click.option('--metrics', is_flag=True, default=False, help='Generate request and database latency metrics, served at /metrics in the Prometheus format')
+def dash(repo: str, maintain: str, describe: str, docker: bool, poetry: bool, metrics: bool = False, app_type: str = "basic") -> None:
     """Creates a bare bones Dash Application
 
     Parameters
@@ -69,6 +82,8 @@ def dash(repo: str, maintain: str, describe: str, docker: bool, poetry: bool, ap
         Whether the user needs a docker environment or not
     poetry : bool
         Whether the user needs a poetry environment or not
+    metrics : bool
+        Generate the request and database latency metrics module, served at /metrics
     app_type : str
         Specific type of dash application to create
 
@@ -82,7 +97,7 @@ def dash(repo: str, maintain: str, describe: str, docker: bool, poetry: bool, ap
     
     click.echo(f"Importing {app_type} Dash files...")
     
-    create_dash(app_type=app_type, pyversion=SYS_PY, docker=docker)
+    create_dash(app_type=app_type, pyversion=SYS_PY, docker=docker, metrics=metrics)
     click.echo(f"Dash files have been setup. Run Python dash-{app_type}/dash_{app_type}_template.py to launch server")
 
     if docker:
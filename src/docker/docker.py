@@ -1,37 +1,54 @@
 import click
-from src.functions import create_template_env
+import json
+from src.render.plan import RenderPlan, add_file, execute_plan, new_plan
+from src.virtual_environment.virtual_environment import WHEELHOUSE_PATH, has_wheelhouse
 import sys
 import pathlib
+from typing import List, Optional
 
 SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
 BASE_PATH = pathlib.Path.cwd()
 
 
-def create_docker(pyversion: str) -> None:
-    """Create a Dockerfile
+def plan_docker(plan: RenderPlan, pyversion: str, server: Optional[List[str]] = None) -> None:
+    """Add the Dockerfile and .dockerignore to a render plan
     
     Parameters
     ----------
+    plan : RenderPlan
+        Plan to extend
     pyversion : str
         python version used
+    server : Optional[List[str]]
+        Command serving the generated app, run by the container. Defaults to a bash shell
 
     """
-    click.echo('Creating Dockerfile...')
     output_path = BASE_PATH
-
-    env = create_template_env()
+    # Install from the local wheelhouse when `pyrepo wheelhouse` has filled one
+    wheelhouse = WHEELHOUSE_PATH.name if has_wheelhouse() else ''
 
     docker_files = ['Dockerfile_proj','.dockerignore']
     for x in docker_files:
-        template = env.get_template(x)
-        # Render config file
-        output = template.render(pyversion=pyversion)
-
-        if x =='Dockerfile_proj':
-            x = 'Dockerfile'
-        # Save rendered file to disk
-        with open(output_path.joinpath(x), 'w') as file:
-            file.write(output)
+        output = 'Dockerfile' if x == 'Dockerfile_proj' else x
+        add_file(plan, x, output_path.joinpath(output), {'pyversion': pyversion, 'wheelhouse': wheelhouse,
+                                                         'server': json.dumps(server) if server else ''})
+
+
+def create_docker(pyversion: str, server: Optional[List[str]] = None) -> None:
+    """Create a Dockerfile
+    
+    Parameters
+    ----------
+    pyversion : str
+        python version used
+    server : Optional[List[str]]
+        Command serving the generated app, run by the container. Defaults to a bash shell
+
+    """
+    click.echo('Creating Dockerfile...')
+    plan = new_plan()
+    plan_docker(plan, pyversion=pyversion, server=server)
+    execute_plan(plan)
     click.echo('Dockerfile has been integrated. See configuration in ./Dockerfile. Reference .dockerignore for files to exclude from the build image.')
 
 
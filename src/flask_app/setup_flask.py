@@ -1,45 +1,63 @@
 import click
 import sys
 import pathlib
-import os
 
 from src.cicd.githubactions import create_github_actions
 from src.docker.docker import create_docker
-from src.functions import squash_requirement_files, create_template_env
+from src.render.plan import RenderPlan, add_file, add_requirements, execute_plan, new_plan
 from src.virtual_environment.virtual_environment import create_poetry, create_virtualenv
 
 
 SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
 BASE_PATH = pathlib.Path.cwd()
+# Production server of the app, run from the repository root (e.g. by the Dockerfile)
+FLASK_SERVER = ['gunicorn', '-c', 'flask/flask_gunicorn.py']
+FLASK_WORKER_CLASSES = ['gthread', 'gevent']
 
 
-def create_flask(docker: bool) -> None:
-    """Create Flask App
+def plan_flask(plan: RenderPlan, docker: bool, metrics: bool = False, worker_class: str = 'gthread') -> None:
+    """Add the Flask App to a render plan
     
     Parameters
     ----------
+    plan : RenderPlan
+        Plan to extend
     docker : bool
         Whether the user needs a docker environment or not
+    metrics : bool
+        Generate the request and database latency metrics module, served at /metrics
+    worker_class : str
+        Default gunicorn worker of the production server, gthread (threads) or gevent (greenlets)
 
     """
-    os.makedirs('flask', exist_ok=True)
     output_path = BASE_PATH.joinpath('flask')
 
-    env = create_template_env()
+    add_file(plan, 'flask_app.py', output_path.joinpath('flask_app.py'), {'pyversion': SYS_PY})
+    add_requirements(plan, 'flask_requirements.txt')
+    add_file(plan, 'flask_gunicorn.py', output_path.joinpath('flask_gunicorn.py'), {'pyversion': SYS_PY, 'worker_class': worker_class})
+    if worker_class == 'gevent':
+        add_requirements(plan, 'flask_gevent_requirements.txt')
+    # Copied verbatim, the module has no template variables
+    if metrics:
+        add_file(plan, 'metrics.py', output_path.joinpath('metrics.py'), {}, copy=True)
+
+
+def create_flask(docker: bool, metrics: bool = False, worker_class: str = 'gthread') -> None:
+    """Create Flask App
     
-    flask_files = ['flask_app.py', 'flask_requirements.txt']
-    for x in flask_files:
-        if x.endswith('.txt'):
-            output = squash_requirement_files(x)
-            with open(BASE_PATH.joinpath('requirements.txt'), "w") as file:
-                file.write(output)
-        else:
-            template = env.get_template(x)
-            # Render config file
-            output = template.render(pyversion=SYS_PY)
-            # Save rendered file to disk
-            with open(output_path.joinpath(x), 'w') as file:
-                file.write(output)
+    Parameters
+    ----------
+    docker : bool
+        Whether the user needs a docker environment or not
+    metrics : bool
+        Generate the request and database latency metrics module, served at /metrics
+    worker_class : str
+        Default gunicorn worker of the production server, gthread (threads) or gevent (greenlets)
+
+    """
+    plan = new_plan()
+    plan_flask(plan, docker=docker, metrics=metrics, worker_class=worker_class)
+    execute_plan(plan)
 
 
         
@@ -50,7 +68,9 @@ def create_flask(docker: bool) -> None:
 @click.option('--maintain', '-m', prompt='Maintainer', help='The name of the repository maintainer')
 @click.option('--docker', is_flag=True, prompt='Docker? Deny to use virtual environment', help='Whether to include build a docker image or not, defaults to no')
 @click.option('--poetry', is_flag=True, prompt='Poetry? Deny to use virtualenv', help='Whether to use poetry for virtual environment manager. If no, then virtualenv environment used.')
-def flask(repo: str, describe: str, maintain: str, docker: bool, poetry: bool) -> None:
+@click.option('--metrics', is_flag=True, default=False, help='Generate request and database latency metrics, served at /metrics in the Prometheus format')
+@click.option('--worker-class', type=click.Choice(FLASK_WORKER_CLASSES), default='gthread', help='gunicorn worker of the production server: gthread for threads, gevent for greenlets. Defaults to gthread')
+def flask(repo: str, describe: str, maintain: str, docker: bool, poetry: bool, metrics: bool, worker_class: str) -> None:
     """
     Easy setup of flask repo with basic configuration
 
@@ -66,6 +86,10 @@ def flask(repo: str, describe: str, maintain: str, docker: bool, poetry: bool) -
         Whether to include a Dockerfile or not
     poetry : bool
         Does the user want a poetry based virtual environment
+    metrics : bool
+        Generate the request and database latency metrics module, served at /metrics
+    worker_class : str
+        Default gunicorn worker of the production server, gthread or gevent
 
     """
     arg_list = [True if item is None else False for item in locals().values()]
@@ -79,11 +103,11 @@ def flask(repo: str, describe: str, maintain: str, docker: bool, poetry: bool) -
     create_github_actions(docker=True)
     print('Github actions created')
 
-    create_flask(docker=True)
+    create_flask(docker=True, metrics=metrics, worker_class=worker_class)
     click.echo('Flask Application setup is complete. See configuration in flask/app.py')
 
     if docker:
-        create_docker(pyversion=SYS_PY)
+        create_docker(pyversion=SYS_PY, server=FLASK_SERVER)
         click.echo('Dockerfile has been integrated. See configuration in ./Dockerfile. Reference .dockerignore for files to exclude from the build image.')
     elif poetry:
         click.echo('Creating poetry environment')
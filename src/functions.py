@@ -1,4 +1,5 @@
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+import functools
 import sys
 from pathlib import Path
 
@@ -7,24 +8,26 @@ SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
 BASE_PATH = Path.cwd()
 
 
+@functools.lru_cache(maxsize=None)
 def create_template_env(BASE_PATH: Path = BASE_PATH) -> Environment:
+    """Return the process-wide Jinja environment for the templates folder
+
+    The environment is built once per base path and shared by every creator, so a
+    template is parsed and compiled at most once per run. Compiled templates are also
+    persisted to .pyrepo/jinja_cache; Jinja checks each cached entry against the
+    checksum of the template source, so repeat runs skip compilation until a template
+    is edited.
+
+    Parameters
+    ----------
+    BASE_PATH : Path
+        Repository root containing the templates folder
+
+    """
     # Load Jinja environment and grab templates
     template_path = BASE_PATH.joinpath("templates")
+    cache_path = BASE_PATH.joinpath(".pyrepo", "jinja_cache")
+    cache_path.mkdir(parents=True, exist_ok=True)
     file_loader = FileSystemLoader(str(template_path))
-    env = Environment(loader=file_loader)
+    env = Environment(loader=file_loader, bytecode_cache=FileSystemBytecodeCache(str(cache_path)))
     return env
-
-
-def squash_requirement_files(x: str) -> str:
-    # Get jinja environment
-    env = create_template_env()
-    # requirements_template is grabbing the .txt file within the templates folder
-    requirements_template = env.get_template(x)
-    # root_requirements_template is grabbing the requirements.txt at the root directory
-    root_requirements_template = Environment(loader=FileSystemLoader(str(BASE_PATH))).get_template('requirements.txt')
-    # output combines the two .txt files into one
-    output = requirements_template.render() + '\n' + root_requirements_template.render()
-    
-    return output
-
-
@@ -1,16 +1,31 @@
 import click
+import concurrent.futures
 import sys
 import pathlib
-import os
 
 from src.docker.docker import create_docker
-from src.functions import squash_requirement_files, create_template_env
-from src.virtual_environment.virtual_environment import create_poetry, create_virtualenv, activate_and_run
+from src.render.plan import RenderPlan, add_file, add_requirements, execute_plan, new_plan
+from src.timing.timing import timed
+from src.virtual_environment.virtual_environment import create_env, create_poetry, create_virtualenv, install_requirements, run_in_env
 
 SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
 BASE_PATH = pathlib.Path.cwd()
 
-env = create_template_env()
+
+def plan_automl(plan: RenderPlan) -> None:
+    """Add the Auto ML Implementation to a render plan
+    
+    Parameters
+    ----------
+    plan : RenderPlan
+        Plan to extend
+
+    """
+    output_path = BASE_PATH.joinpath("ml")
+
+    add_file(plan, "automl.py", output_path.joinpath("automl.py"), {'pyversion': SYS_PY})
+    add_requirements(plan, "automl_requirements.txt")
+
 
 def create_automl() -> None:
     """Auto ML Implementation
@@ -21,23 +36,27 @@ def create_automl() -> None:
 
     """
     click.echo('Creating AutoML Implementation...')
-    os.makedirs("ml", exist_ok=True)
+    plan = new_plan()
+    plan_automl(plan)
+    execute_plan(plan)
+    click.echo("AutoML Implementation created. See ml/ directory to begin.")
+
+
+def plan_fullml(plan: RenderPlan) -> None:
+    """Add the Full ML Implementation to a render plan
+    
+    Parameters
+    ----------
+    plan : RenderPlan
+        Plan to extend
+
+    """
     output_path = BASE_PATH.joinpath("ml")
    
-    automl_files = ["automl.py", "automl_requirements.txt"]
-
-    # Render config file and save rendered file to disk
-    for f in automl_files:
-        if f.endswith('.txt'):
-            output = squash_requirement_files(f)
-            with open(BASE_PATH.joinpath('requirements.txt'), "w") as file:
-                file.write(output)
-        else:
-            template = env.get_template(f)
-            output = template.render(pyversion=SYS_PY)
-            with open(output_path.joinpath(f), "w") as file:
-                file.write(output)
-    click.echo("AutoML Implementation created. See ml/ directory to begin.")
+    fullml_files = ["ingest.py", "clean.py", "validate.py", "profile.py", "model.py", "dvc.yaml", "params.yaml"]
+    for f in fullml_files:
+        add_file(plan, f, output_path.joinpath(f), {'pyversion': SYS_PY})
+    add_requirements(plan, "fullml_requirements.txt")
 
 
 def create_fullml() -> None:
@@ -49,22 +68,9 @@ def create_fullml() -> None:
 
     """
     click.echo('Creating Full ML Pipeline Implementation...')
-    os.makedirs("ml", exist_ok=True)
-    output_path = BASE_PATH.joinpath("ml")
-   
-    fullml_files = ["ingest.py", "clean.py", "validate.py", "profile.py", "model.py", "dvc.yaml", "params.yaml", "fullml_requirements.txt"]
-
-    # Render config file and save rendered file to disk
-    for f in fullml_files:
-        if f.endswith('.txt'):
-            output = squash_requirement_files(f)
-            with open(BASE_PATH.joinpath('requirements.txt'), "w") as file:
-                file.write(output)
-        else:
-            template = env.get_template(f)
-            output = template.render(pyversion=SYS_PY)
-            with open(output_path.joinpath(f), "w") as file:
-                file.write(output)
+    plan = new_plan()
+    plan_fullml(plan)
+    execute_plan(plan)
     
    
 
@@ -143,16 +149,24 @@ def fullml(docker: bool, poetry: bool, repo: str, describe: str, maintain: str)
         if arg_eval > 0:
             sys.exit('Exiting setup...please provide all flags for command. Try pyrepo <command> --help to learn more.')
     
-    # Create Full ML Pipeline
-    create_fullml()
-
-    # Environment/Dependency Management
+    # Create Full ML Pipeline and handle Environment/Dependency Management
     if docker:
+        create_fullml()
         create_docker(pyversion=SYS_PY)
     elif poetry:
+        create_fullml()
         create_poetry(repo=repo, maintain=maintain, description=describe)
     else:
-        create_virtualenv(pyversion=SYS_PY)
+        # Create the virtual environment while the pipeline renders, requirements are
+        # installed once the merged requirements.txt has been written
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            venv = pool.submit(create_env, SYS_PY, BASE_PATH)
+            create_fullml()
+            venv.result()
+        click.echo('Creating virtual environment and installing requirements...')
+        status = install_requirements()
+        if status != 0:
+            sys.exit(status)
     
     # Delete dvc.yaml so doesn't clutter dvc init
     BASE_PATH.joinpath('templates', 'dvc.yaml').unlink()
@@ -164,8 +178,17 @@ def fullml(docker: bool, poetry: bool, repo: str, describe: str, maintain: str)
     for path in new_paths:
         data_path.joinpath(path).mkdir(exist_ok=True)
     
-    # Activate VE and run dvc init
-    activate_and_run('dvc init')
+    # dvc comes from fullml_requirements.txt, only the ./env set up above has it installed by now.
+    # The docker image and the poetry environment get it once their requirements are installed
+    if docker or poetry:
+        click.echo('Run `dvc init` once the requirements are installed to start tracking data with dvc')
+    else:
+        with timed('run', 'dvc init'):
+            status = run_in_env(['dvc', 'init'])
+        if status == 127:
+            click.echo('dvc is missing, run `dvc init` once the requirements are installed')
+        elif status != 0:
+            sys.exit(f'dvc init failed with exit status {status}')
 
     click.echo("Full ML Implementation created. See ml directory or run `dvc status` to begin.")
     click.echo("Visit the README for more in depth information on how to use the full ML use case")
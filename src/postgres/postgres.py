@@ -2,8 +2,8 @@ import click
 import sys
 import pathlib
 
-from src.flask_app.setup_flask import create_flask
-from src.functions import squash_requirement_files, create_template_env
+from src.flask_app.setup_flask import FLASK_SERVER, FLASK_WORKER_CLASSES, create_flask
+from src.render.plan import RenderPlan, add_file, add_requirements, execute_plan, new_plan
 from src.virtual_environment.virtual_environment import create_poetry, create_virtualenv
 from src.docker.docker import create_docker
 
@@ -11,36 +11,59 @@ SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
 BASE_PATH = pathlib.Path.cwd()
 
 
-def create_postgres(pyversion: str, docker: bool, flask: bool) -> None:
-    """Create Flask App w/ Postgres Database
+def plan_postgres(plan: RenderPlan, pyversion: str, docker: bool, flask: bool, metrics: bool = False, pgbouncer: bool = False) -> None:
+    """Add the Postgres Database files for the Flask App to a render plan
     
     Parameters
     ----------
+    plan : RenderPlan
+        Plan to extend
     pyversion : str
         python version used
     docker : bool
         Whether the user needs a docker environment or not
     flask : bool
         Does the user want a flask application?
+    metrics : bool
+        Generate the request and database latency metrics module, served at /metrics
+    pgbouncer : bool
+        Connect through PgBouncer in transaction pooling mode, with its configuration and a local stand-in
 
     """
     output_path = BASE_PATH.joinpath('flask')
-    
-    env = create_template_env()
 
-    flask_postgres_files = ['flask_postgres_README.md','flask_postgres_requirements.txt','flask_postgres.py']
+    flask_postgres_files = ['flask_postgres_README.md', 'flask_postgres.py', 'flask_postgres_ingest.py']
     for x in flask_postgres_files:
-        if x.endswith('.txt'):
-            output = squash_requirement_files(x)
-            with open(BASE_PATH.joinpath('requirements.txt'), "w") as file:
-                file.write(output)
-        else:
-            template = env.get_template(x)
-            # Render config file
-            output = template.render(pyversion=SYS_PY)
-            # Save rendered file to disk
-            with open(output_path.joinpath(x), 'w') as file:
-                file.write(output)
+        add_file(plan, x, output_path.joinpath(x), {'pyversion': SYS_PY, 'db_pooler': 'pgbouncer' if pgbouncer else ''})
+    add_requirements(plan, 'flask_postgres_requirements.txt')
+    if pgbouncer:
+        add_file(plan, 'pgbouncer.ini', output_path.joinpath('pgbouncer.ini'), {}, copy=True)
+        add_file(plan, 'pgbouncer_stub.py', output_path.joinpath('pgbouncer_stub.py'), {'pyversion': SYS_PY})
+    # Copied verbatim, the module has no template variables
+    if metrics:
+        add_file(plan, 'metrics.py', output_path.joinpath('metrics.py'), {}, copy=True)
+
+
+def create_postgres(pyversion: str, docker: bool, flask: bool, metrics: bool = False, pgbouncer: bool = False) -> None:
+    """Create Flask App w/ Postgres Database
+    
+    Parameters
+    ----------
+    pyversion : str
+        python version used
+    docker : bool
+        Whether the user needs a docker environment or not
+    flask : bool
+        Does the user want a flask application?
+    metrics : bool
+        Generate the request and database latency metrics module, served at /metrics
+    pgbouncer : bool
+        Connect through PgBouncer in transaction pooling mode
+
+    """
+    plan = new_plan()
+    plan_postgres(plan, pyversion=pyversion, docker=docker, flask=flask, metrics=metrics, pgbouncer=pgbouncer)
+    execute_plan(plan)
 
 @click.command()
 @click.option('--repo', '-r', prompt='Configure template repository...\nRepository Name', help='The name of the current project')
@@ -49,7 +72,10 @@ def create_postgres(pyversion: str, docker: bool, flask: bool) -> None:
 @click.option('--docker', is_flag=True, prompt='Docker? Deny to use virtual environment', help='Whether to include build a docker image or not, defaults to no')
 @click.option('--poetry', is_flag=True, prompt='Poetry? Deny to use virtualenv', help='Whether to use poetry for virtual environment manager. If no, then virtualenv environment used.')
 @click.option('--flask/--no-flask', default=False, prompt='Flask Application', help='Whether to build Flask app or not, defaults to no Flask app')
-def postgres(repo: str, description: str, maintain: str, docker: bool, flask: bool, poetry: bool) -> None:
+@click.option('--metrics', is_flag=True, default=False, help='Generate request and database latency metrics, served at /metrics in the Prometheus format')
+@click.option('--pgbouncer', is_flag=True, default=False, help='Connect through PgBouncer in transaction pooling mode, generates its configuration and a local stand-in')
+@click.option('--worker-class', type=click.Choice(FLASK_WORKER_CLASSES), default='gthread', help='gunicorn worker of the production server: gthread for threads, gevent for greenlets. Defaults to gthread')
+def postgres(repo: str, description: str, maintain: str, docker: bool, flask: bool, poetry: bool, metrics: bool, pgbouncer: bool, worker_class: str) -> None:
     """Creates the Postgres Integration with Flask
 
     Parameters
@@ -66,6 +92,12 @@ def postgres(repo: str, description: str, maintain: str, docker: bool, flask: bo
         Does the user want a flask application?
     poetry : bool
         Does the user want a poetry based virtual environment
+    metrics : bool
+        Generate the request and database latency metrics module, served at /metrics
+    pgbouncer : bool
+        Connect through PgBouncer in transaction pooling mode
+    worker_class : str
+        Default gunicorn worker of the production server, gthread or gevent
 
     """
     arg_list = [True if item is None else False for item in locals().values()]
@@ -77,16 +109,16 @@ def postgres(repo: str, description: str, maintain: str, docker: bool, flask: bo
     if flask == False:
         sys.exit('This configuration requires a flask application to exist, please enable flask to integrate postgres database.')
 
-    create_flask(docker=True)
+    create_flask(docker=True, metrics=metrics, worker_class=worker_class)
     click.echo('Flask Application setup is complete. See configuration in flask/app.py')
     
     click.echo('Creating Postgres files...')
-    create_postgres(pyversion=SYS_PY, docker=docker, flask=flask)
+    create_postgres(pyversion=SYS_PY, docker=docker, flask=flask, metrics=metrics, pgbouncer=pgbouncer)
     click.echo('Postgres integration files have been setup. Please see flask_postgres_README.md for instructions on how to set up Postgres credentials and DB tables via CLI.')
 
     if docker:
         click.echo('You have decided to use Docker')
-        create_docker(pyversion=SYS_PY)
+        create_docker(pyversion=SYS_PY, server=FLASK_SERVER)
     elif poetry:
         click.echo('Creating poetry environment')
         create_poetry(repo=repo, maintain=maintain, description=description)
@@ -0,0 +1,319 @@
+import click
+import datetime
+import html
+import json
+import os
+import pathlib
+import pstats
+import signal
+import subprocess as sp
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional, Set, TypedDict
+
+from src.timing.timing import timed
+from src.virtual_environment.virtual_environment import env_python
+
+BASE_PATH = pathlib.Path.cwd()
+REPORTS_PATH = BASE_PATH.joinpath('reports', 'profiles')
+
+
+class ProfileTarget(NamedTuple):
+    """How a generated entry point is run under a profiler
+
+    Parameters
+    ----------
+    cwd : str
+        Directory to run from, relative to the repository root
+    args : List[str]
+        Arguments passed to python, relative to cwd
+    server : bool
+        Whether the target serves until it is stopped
+
+    """
+    cwd: str
+    args: List[str]
+    server: bool = False
+
+
+# Web apps run without the debug reloader, which would serve from an unprofiled child process
+PROFILE_TARGETS: Dict[str, ProfileTarget] = {
+    'flask/flask_app.py': ProfileTarget('flask', ['-m', 'flask', '--app', 'flask_app', 'run', '--no-reload'], server=True),
+    'flask/flask_postgres.py': ProfileTarget('flask', ['-m', 'flask', '--app', 'flask_postgres', 'run', '--no-reload'], server=True),
+    'fastapi/fastapi_app.py': ProfileTarget('fastapi', ['-m', 'uvicorn', 'fastapi_app:app'], server=True),
+    'dash-basic/dash_basic_template.py': ProfileTarget('dash-basic', ['-m', 'flask', '--app', 'dash_basic_template:server', 'run', '--no-reload'], server=True),
+    'dash-gis/dash_gis_template.py': ProfileTarget('dash-gis', ['-m', 'flask', '--app', 'dash_gis_template:server', 'run', '--no-reload'], server=True),
+    # ML stages read and write data/ relative to the repository root
+    'ml/ingest.py': ProfileTarget('.', ['ml/ingest.py']),
+    'ml/clean.py': ProfileTarget('.', ['ml/clean.py']),
+    'ml/validate.py': ProfileTarget('.', ['ml/validate.py']),
+    'ml/profile.py': ProfileTarget('.', ['ml/profile.py']),
+    'ml/model.py': ProfileTarget('.', ['ml/model.py']),
+    'ml/automl.py': ProfileTarget('.', ['ml/automl.py']),
+}
+
+
+class FunctionStats(TypedDict):
+    """Time spent in one function of a profile
+
+    Parameters
+    ----------
+    function : str
+        Function as "file:line(name)"
+    self_seconds : float
+        Time spent in the function itself
+    total_seconds : float
+        Time spent in the function and everything it called
+    calls : Optional[int]
+        Number of calls, None for sampling profilers
+
+    """
+    function: str
+    self_seconds: float
+    total_seconds: float
+    calls: Optional[int]
+
+
+def resolve_target(target: str) -> pathlib.Path:
+    """Find the entry point a target refers to
+
+    Parameters
+    ----------
+    target : str
+        Path of the entry point relative to the repository root, or its file name with or without .py
+
+    """
+    path = pathlib.Path(target)
+    if path.suffix != '.py':
+        path = path.with_suffix('.py')
+    if BASE_PATH.joinpath(path).is_file():
+        return path
+    matches = [pathlib.Path(x) for x in PROFILE_TARGETS if pathlib.Path(x).name == path.name and BASE_PATH.joinpath(x).is_file()]
+    if len(matches) == 1:
+        return matches[0]
+    sys.exit(f'No generated entry point found for {target}. Known targets: {", ".join(PROFILE_TARGETS)}')
+
+
+def shorten_path(path: str) -> str:
+    """Shorten a source path for reports, relative to the repository root or site-packages
+
+    Parameters
+    ----------
+    path : str
+        Source file path as recorded by the profiler
+
+    """
+    if 'site-packages' in path:
+        return path.split('site-packages')[-1].lstrip('/\\')
+    try:
+        return pathlib.Path(path).relative_to(BASE_PATH).as_posix()
+    except ValueError:
+        return path
+
+
+def cprofile_functions(stats_path: pathlib.Path) -> List[FunctionStats]:
+    """Per function timings of a cProfile stats file
+
+    Parameters
+    ----------
+    stats_path : pathlib.Path
+        File written by `python -m cProfile -o`
+
+    """
+    stats = pstats.Stats(str(stats_path))
+    functions: List[FunctionStats] = []
+    for (file, line, name), (_, calls, self_seconds, total_seconds, _) in stats.stats.items():  # type: ignore[attr-defined]
+        functions.append(FunctionStats(function=f'{shorten_path(file)}:{line}({name})', self_seconds=self_seconds,
+                                       total_seconds=total_seconds, calls=calls))
+    return functions
+
+
+def pyinstrument_functions(root_frame: Dict[str, object]) -> List[FunctionStats]:
+    """Per function timings of a pyinstrument JSON call tree
+
+    Parameters
+    ----------
+    root_frame : Dict[str, object]
+        "root_frame" of a report written by pyinstrument's JSON renderer
+
+    """
+    functions: Dict[str, FunctionStats] = {}
+
+    def visit(frame: Dict[str, object], stack: Set[str]) -> None:
+        key = f"{shorten_path(str(frame['file_path']))}:{frame['line_no']}({frame['function']})"
+        # pyinstrument reports a frame's own time as a "[self]" child, keep it with the frame
+        children = [x for x in frame.get('children', []) if isinstance(x, dict) and x['function'] != '[self]']  # type: ignore[attr-defined]
+        seconds = float(frame['time'])  # type: ignore[arg-type]
+        entry = functions.setdefault(key, FunctionStats(function=key, self_seconds=0.0, total_seconds=0.0, calls=None))
+        entry['self_seconds'] += seconds - sum(float(x['time']) for x in children)
+        # Recursive calls are already part of the outermost call's total
+        if key not in stack:
+            entry['total_seconds'] += seconds
+        for child in children:
+            visit(child, stack | {key})
+
+    visit(root_frame, set())
+    return list(functions.values())
+
+
+def write_html(path: pathlib.Path, title: str, functions: List[FunctionStats]) -> None:
+    """Write the hottest functions of a profile as an HTML table
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Report to write
+    title : str
+        Report heading
+    functions : List[FunctionStats]
+        Functions sorted hottest first
+
+    """
+    rows = '\n'.join(
+        f"<tr><td>{html.escape(x['function'])}</td><td>{x['self_seconds']:.4f}</td><td>{x['total_seconds']:.4f}</td><td>{'' if x['calls'] is None else x['calls']}</td></tr>"
+        for x in functions[:200]
+    )
+    path.write_text(f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{html.escape(title)}</title></head><body>\n'
+                    f'<h1>{html.escape(title)}</h1>\n<table border="1" cellspacing="0" cellpadding="4">\n'
+                    f'<tr><th>Function</th><th>Self (s)</th><th>Total (s)</th><th>Calls</th></tr>\n{rows}\n</table>\n</body></html>\n')
+
+
+def run_target(command: List[str], cwd: pathlib.Path, duration: Optional[float]) -> int:
+    """Run a command to completion, interrupting it after a duration if one is given
+
+    A Ctrl+C also reaches the profiled process, which stops and saves its profile;
+    pyrepo waits for that instead of exiting first.
+
+    Parameters
+    ----------
+    command : List[str]
+        Command to run
+    cwd : pathlib.Path
+        Directory to run it from
+    duration : Optional[float]
+        Seconds after which the command is sent SIGINT
+
+    """
+    process = sp.Popen(command, cwd=cwd)
+    deadline = None if duration is None else time.monotonic() + duration
+    while True:
+        try:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            return process.wait(timeout=timeout)
+        except sp.TimeoutExpired:
+            click.echo(f'Stopping after {duration} s')
+            process.send_signal(signal.SIGINT)
+            deadline = None
+        except KeyboardInterrupt:
+            deadline = None
+
+
+def profile_target(target: str, profiler: str, duration: Optional[float]) -> pathlib.Path:
+    """Run a generated entry point under a profiler and write HTML and JSON reports
+
+    The target runs with the interpreter of ./env when it exists, so the profiler
+    must be installed there (pyinstrument is in requirements.txt, cProfile ships with python).
+
+    Parameters
+    ----------
+    target : str
+        Entry point to profile, see resolve_target
+    profiler : str
+        pyinstrument or cprofile
+    duration : Optional[float]
+        Seconds to run for before stopping the target, for servers
+
+    Returns
+    -------
+    pathlib.Path
+        The JSON report
+
+    """
+    path = resolve_target(target)
+    spec = PROFILE_TARGETS.get(path.as_posix(), ProfileTarget('.', [path.as_posix()]))
+    python = env_python()
+
+    REPORTS_PATH.mkdir(parents=True, exist_ok=True)
+    stem = REPORTS_PATH.joinpath(f"{path.stem}-{profiler}-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}")
+    if profiler == 'pyinstrument':
+        raw = stem.with_suffix('.pyisession')
+        command = [python, '-m', 'pyinstrument', '-r', 'pyisession', '-o', str(raw)] + spec.args
+    else:
+        raw = stem.with_suffix('.prof')
+        command = [python, '-m', 'cProfile', '-o', str(raw)] + spec.args
+
+    click.echo(f'Profiling {path.as_posix()} with {profiler}...')
+    if spec.server and duration is None:
+        click.echo('Serving under the profiler, stop it with Ctrl+C (or pass --duration) to write the reports')
+    with timed('profile', path.as_posix()):
+        status = run_target(command, BASE_PATH.joinpath(spec.cwd), duration)
+    # An interrupted target still saves its profile, only a missing one is an error
+    if not raw.exists():
+        sys.exit(f'{profiler} did not write a profile (exit status {status}). Is it installed in {python}?')
+
+    with timed('profile report', path.as_posix()):
+        if profiler == 'pyinstrument':
+            native = stem.with_suffix('.pyinstrument.json')
+            for renderer, output in [('html', stem.with_suffix('.html')), ('json', native)]:
+                sp.run([python, '-m', 'pyinstrument', '--load', str(raw), '-r', renderer, '-o', str(output)], check=True)
+            with open(native, 'r') as file:
+                functions = pyinstrument_functions(json.load(file)['root_frame'])
+        else:
+            functions = cprofile_functions(raw)
+        functions.sort(key=lambda x: x['self_seconds'], reverse=True)
+        if profiler == 'cprofile':
+            write_html(stem.with_suffix('.html'), f'{path.as_posix()} ({profiler})', functions)
+
+        report = {
+            'target': path.as_posix(),
+            'profiler': profiler,
+            'command': command[1:],
+            'exit_status': status,
+            'recorded_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'functions': functions,
+        }
+        json_path = stem.with_suffix('.json')
+        with open(json_path, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    click.echo(f'Reports written to {os.path.relpath(stem.with_suffix(".html"), BASE_PATH)} and {os.path.relpath(json_path, BASE_PATH)}')
+    return json_path
+
+
+def compare_profiles(before: str, after: str, top: int) -> List[str]:
+    """Diff the self time of the hot functions of two JSON profiles written by profile_target
+
+    Parameters
+    ----------
+    before : str
+        Baseline JSON report
+    after : str
+        JSON report to compare against the baseline
+    top : int
+        Number of functions to show, largest change first
+
+    Returns
+    -------
+    List[str]
+        The diff as a text table
+
+    """
+    seconds: List[Dict[str, float]] = []
+    profilers = set()
+    for report_path in (before, after):
+        with open(report_path, 'r') as file:
+            report = json.load(file)
+        profilers.add(report['profiler'])
+        seconds.append({x['function']: float(x['self_seconds']) for x in report['functions']})
+    if len(profilers) > 1:
+        click.echo('The profiles were taken with different profilers, builtins are named differently by each')
+
+    changes = sorted(((name, seconds[0].get(name, 0.0), seconds[1].get(name, 0.0)) for name in set(seconds[0]) | set(seconds[1])),
+                     key=lambda x: abs(x[2] - x[1]), reverse=True)[:top]
+    width = max([len('Function')] + [len(x[0]) for x in changes])
+    lines = [f"{'Function':<{width}}  {'Before':>8}  {'After':>8}  {'Change':>8}"]
+    lines.append('-' * len(lines[0]))
+    lines.extend(f'{name:<{width}}  {old:>8.3f}  {new:>8.3f}  {new - old:>+8.3f}' for name, old, new in changes)
+    lines.append(f"{'Total self time':<{width}}  {sum(seconds[0].values()):>8.3f}  {sum(seconds[1].values()):>8.3f}  "
+                 f"{sum(seconds[1].values()) - sum(seconds[0].values()):>+8.3f}")
+    return lines
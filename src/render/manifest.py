@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import pathlib
+from typing import Dict, Optional, TypedDict
+
+BASE_PATH = pathlib.Path.cwd()
+MANIFEST_PATH = BASE_PATH.joinpath('.pyrepo', 'manifest.json')
+
+
+class ManifestEntry(TypedDict):
+    """Inputs and result of the last render of one output file
+
+    Parameters
+    ----------
+    template : str
+        Template(s) the output was rendered from
+    template_hash : str
+        sha256 of the template source(s)
+    context : Dict[str, str]
+        Variables the template was rendered with
+    output_hash : str
+        sha256 of the rendered output
+
+    """
+    template: str
+    template_hash: str
+    context: Dict[str, str]
+    output_hash: str
+
+
+def hash_text(text: str) -> str:
+    """sha256 hex digest of a string
+
+    Parameters
+    ----------
+    text : str
+        Text to hash
+
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def hash_templates(*templates: str) -> str:
+    """sha256 hex digest of one or more template sources
+
+    Parameters
+    ----------
+    templates : str
+        Names of the templates within the templates folder
+
+    """
+    digest = hashlib.sha256()
+    for template in templates:
+        digest.update(template.encode('utf-8'))
+        digest.update(BASE_PATH.joinpath('templates', template).read_bytes())
+    return digest.hexdigest()
+
+
+def manifest_key(path: pathlib.Path) -> str:
+    """Manifest key of an output file, its path relative to the repository root
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Output file
+
+    """
+    return pathlib.Path(os.path.relpath(path, BASE_PATH)).as_posix()
+
+
+def load_manifest() -> Dict[str, ManifestEntry]:
+    """Load .pyrepo/manifest.json, an unreadable or missing manifest is treated as empty
+    """
+    try:
+        with open(MANIFEST_PATH, 'r') as file:
+            manifest: Dict[str, ManifestEntry] = json.load(file)
+    except (OSError, ValueError):
+        manifest = {}
+    return manifest
+
+
+def save_manifest(manifest: Dict[str, ManifestEntry]) -> None:
+    """Write .pyrepo/manifest.json
+
+    Parameters
+    ----------
+    manifest : Dict[str, ManifestEntry]
+        Manifest entries keyed by output path
+
+    """
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(MANIFEST_PATH, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+
+
+def is_current(entry: Optional[ManifestEntry], template_hash: str, context: Dict[str, str], path: pathlib.Path) -> bool:
+    """Whether an output is up to date: same template and context as its last render,
+    and the file on disk is still the one that render produced
+
+    Parameters
+    ----------
+    entry : Optional[ManifestEntry]
+        Manifest entry of the output, if any
+    template_hash : str
+        sha256 of the template source(s) about to be rendered
+    context : Dict[str, str]
+        Variables the template is about to be rendered with
+    path : pathlib.Path
+        Output file
+
+    """
+    if entry is None or entry['template_hash'] != template_hash or entry['context'] != context:
+        return False
+    try:
+        return hash_text(path.read_text()) == entry['output_hash']
+    except OSError:
+        return False
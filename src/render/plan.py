@@ -0,0 +1,261 @@
+import click
+import concurrent.futures
+import os
+import pathlib
+import sys
+import tempfile
+from typing import Dict, List, NamedTuple
+
+from src.functions import create_template_env
+from src.requirements.requirements import merge_requirements
+from src.timing.timing import timed
+from src.render.manifest import ManifestEntry, hash_templates, hash_text, is_current, load_manifest, manifest_key, save_manifest
+
+SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
+BASE_PATH = pathlib.Path.cwd()
+REQUIREMENTS_PATH = BASE_PATH.joinpath('requirements.txt')
+
+
+class PlannedFile(NamedTuple):
+    """A single output file of a render plan
+
+    Parameters
+    ----------
+    template : str
+        Name of the template within the templates folder
+    output : pathlib.Path
+        Where the rendered file is written
+    context : Dict[str, str]
+        Variables passed to the template when rendering
+    copy : bool
+        Copy the template verbatim instead of rendering it, for files that carry their own Jinja syntax
+
+    """
+    template: str
+    output: pathlib.Path
+    context: Dict[str, str]
+    copy: bool = False
+
+
+class RenderPlan(NamedTuple):
+    """Every output of a pyrepo run, built before anything is rendered or written
+
+    Parameters
+    ----------
+    files : List[PlannedFile]
+        Files to render or copy, in the order they were planned
+    requirements : List[str]
+        Component requirements templates to merge into the root requirements.txt, once, at the end of the run
+
+    """
+    files: List[PlannedFile]
+    requirements: List[str]
+
+
+def new_plan() -> RenderPlan:
+    """Create an empty render plan"""
+    return RenderPlan(files=[], requirements=[])
+
+
+def add_file(plan: RenderPlan, template: str, output: pathlib.Path, context: Dict[str, str], copy: bool = False) -> None:
+    """Add an output file to the plan, replacing any earlier entry for the same output
+
+    Parameters
+    ----------
+    plan : RenderPlan
+        Plan to extend
+    template : str
+        Name of the template within the templates folder
+    output : pathlib.Path
+        Where the rendered file is written
+    context : Dict[str, str]
+        Variables passed to the template when rendering
+    copy : bool
+        Copy the template verbatim instead of rendering it
+
+    """
+    plan.files[:] = [item for item in plan.files if item.output != output]
+    plan.files.append(PlannedFile(template=template, output=output, context=context, copy=copy))
+
+
+def add_requirements(plan: RenderPlan, template: str) -> None:
+    """Add a component requirements template to the plan
+
+    Parameters
+    ----------
+    plan : RenderPlan
+        Plan to extend
+    template : str
+        Name of the requirements template within the templates folder
+
+    """
+    if template not in plan.requirements:
+        plan.requirements.append(template)
+
+
+def describe_plan(plan: RenderPlan) -> List[str]:
+    """List the plan's outputs as human readable lines, without rendering anything
+
+    Parameters
+    ----------
+    plan : RenderPlan
+        Plan to describe
+
+    """
+    lines = []
+    for item in plan.files:
+        action = 'copy' if item.copy else 'render'
+        lines.append(f"{action:<7}templates/{item.template} -> {os.path.relpath(item.output, BASE_PATH)}")
+    if plan.requirements:
+        lines.append(f"{'merge':<7}{', '.join(plan.requirements)} -> {os.path.relpath(REQUIREMENTS_PATH, BASE_PATH)}")
+    return lines
+
+
+def render_file(item: PlannedFile) -> str:
+    """Render (or copy) a single planned file
+
+    Parameters
+    ----------
+    item : PlannedFile
+        Planned file to render
+
+    """
+    with timed('render', item.template):
+        if item.copy:
+            return BASE_PATH.joinpath('templates', item.template).read_text()
+        return create_template_env().get_template(item.template).render(**item.context)
+
+
+def render_requirements(requirements: List[str]) -> str:
+    """Merge component requirements templates into the root requirements.txt
+
+    Requirements are parsed and deduplicated in memory; the root requirements.txt
+    takes precedence over the components, and every conflict is reported.
+
+    Parameters
+    ----------
+    requirements : List[str]
+        Names of the requirements templates within the templates folder
+
+    """
+    env = create_template_env()
+    sources = []
+    if REQUIREMENTS_PATH.exists():
+        sources.append(('requirements.txt', REQUIREMENTS_PATH.read_text()))
+    sources.extend((x, env.get_template(x).render()) for x in requirements)
+
+    lines, conflicts = merge_requirements(sources)
+    for conflict in conflicts:
+        click.echo(f'Requirement conflict: {conflict}')
+    return '\n'.join(lines) + '\n'
+
+
+def render_plan(plan: RenderPlan) -> Dict[pathlib.Path, str]:
+    """Render every file in the plan concurrently on a thread pool
+
+    Parameters
+    ----------
+    plan : RenderPlan
+        Plan to render
+
+    """
+    outputs: Dict[pathlib.Path, str] = {}
+    with concurrent.futures.ThreadPoolExecutor() as pool:
+        rendered = pool.map(render_file, plan.files)
+        for item, output in zip(plan.files, rendered):
+            outputs[item.output] = output
+    if plan.requirements:
+        with timed('requirements merge', ', '.join(plan.requirements)):
+            outputs[REQUIREMENTS_PATH] = render_requirements(plan.requirements)
+    return outputs
+
+
+def write_outputs(outputs: Dict[pathlib.Path, str]) -> None:
+    """Write rendered files to disk in a single pass
+
+    Every file is first staged as a temporary file next to its destination and only
+    moved into place once all of them were staged, so an interrupted run never
+    leaves a half written file behind.
+
+    Parameters
+    ----------
+    outputs : Dict[pathlib.Path, str]
+        Rendered content keyed by destination path
+
+    """
+    # Temporary files are created private, give them the mode a plain open() would have used
+    umask = os.umask(0)
+    os.umask(umask)
+
+    staged: Dict[pathlib.Path, str] = {}
+    try:
+        for path, content in outputs.items():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=path.parent, prefix=f'.{path.name}.', delete=False) as file:
+                file.write(content)
+                staged[path] = file.name
+            os.chmod(file.name, path.stat().st_mode if path.exists() else 0o666 & ~umask)
+        for path, temp_name in staged.items():
+            os.replace(temp_name, path)
+    except Exception:
+        for temp_name in staged.values():
+            if os.path.exists(temp_name):
+                os.unlink(temp_name)
+        raise
+
+
+def execute_plan(plan: RenderPlan) -> List[str]:
+    """Render the plan and write the results to disk, skipping outputs that are unchanged
+
+    Outputs whose template, render context and on-disk content all match the
+    .pyrepo/manifest.json entry of their last render are neither rendered nor
+    rewritten, so their mtimes stay put for docker, DVC and CI caches.
+
+    Parameters
+    ----------
+    plan : RenderPlan
+        Plan to execute
+
+    Returns
+    -------
+    List[str]
+        Outputs that were (re)written, relative to the repository root
+
+    """
+    manifest = load_manifest()
+    pending = new_plan()
+    entries: Dict[pathlib.Path, ManifestEntry] = {}
+    unchanged = 0
+
+    for item in plan.files:
+        template_hash = hash_templates(item.template)
+        if is_current(manifest.get(manifest_key(item.output)), template_hash, item.context, item.output):
+            unchanged += 1
+            continue
+        pending.files.append(item)
+        entries[item.output] = ManifestEntry(template=item.template, template_hash=template_hash, context=item.context, output_hash='')
+
+    if plan.requirements:
+        template_hash = hash_templates(*plan.requirements)
+        if is_current(manifest.get(manifest_key(REQUIREMENTS_PATH)), template_hash, {}, REQUIREMENTS_PATH):
+            unchanged += 1
+        else:
+            pending.requirements.extend(plan.requirements)
+            entries[REQUIREMENTS_PATH] = ManifestEntry(template=','.join(plan.requirements), template_hash=template_hash, context={}, output_hash='')
+
+    outputs = render_plan(pending)
+    with timed('write', f'{len(outputs)} file(s)'):
+        write_outputs(outputs)
+
+    for path, content in outputs.items():
+        entries[path]['output_hash'] = hash_text(content)
+        manifest[manifest_key(path)] = entries[path]
+    if outputs:
+        save_manifest(manifest)
+
+    changed = [manifest_key(path) for path in outputs]
+    if changed:
+        click.echo(f"Updated {len(changed)} file(s): {', '.join(changed)}")
+    if unchanged:
+        click.echo(f"{unchanged} file(s) unchanged since the last run, skipped")
+    return changed
@@ -0,0 +1,266 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from packaging.requirements import InvalidRequirement
+from packaging.requirements import Requirement as PackagingRequirement
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.version import Version
+
+# pip installs a line ending with these as a file, even when it reads as a valid project name
+ARCHIVE_EXTENSIONS = ('.whl', '.zip', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz', '.tar')
+# A version and whether the bound includes it
+Bound = Tuple[Version, bool]
+
+
+class Requirement(NamedTuple):
+    """A parsed requirements.txt line
+
+    Parameters
+    ----------
+    name : str
+        Project name as first written
+    key : str
+        Normalized project name (PEP 503), used to match the same project across files
+    extras : Tuple[str, ...]
+        Requested extras
+    specifiers : Tuple[str, ...]
+        Version specifiers such as ">=1.0"
+    marker : str
+        Environment marker, empty if there is none
+    url : str
+        Direct reference of a "name @ url" line, empty if there is none
+
+    """
+    name: str
+    key: str
+    extras: Tuple[str, ...]
+    specifiers: Tuple[str, ...]
+    marker: str
+    url: str
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a project name as pip does (PEP 503)
+
+    Parameters
+    ----------
+    name : str
+        Project name
+
+    """
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def requirement_lines(content: str) -> List[str]:
+    """Lines of a requirements file without comments, surrounding whitespace or blank lines
+
+    Parameters
+    ----------
+    content : str
+        Content of the requirements file
+
+    """
+    lines = (x.split(' #')[0].strip() for x in content.splitlines())
+    return [x for x in lines if x and not x.startswith('#')]
+
+
+def parse_requirement(line: str) -> Optional[Requirement]:
+    """Parse a single requirements.txt line
+
+    Parameters
+    ----------
+    line : str
+        Line to parse, comments are ignored
+
+    Returns
+    -------
+    Optional[Requirement]
+        None for blank lines, comments, pip options and lines that name no project,
+        such as paths, archives and VCS urls
+
+    """
+    line = line.split(' #')[0].strip()
+    if not line or line.startswith(('#', '-')):
+        return None
+    try:
+        parsed = PackagingRequirement(line)
+    except InvalidRequirement:
+        return None
+    if parsed.name.lower().endswith(ARCHIVE_EXTENSIONS):
+        return None
+    return Requirement(name=parsed.name, key=normalize_name(parsed.name), extras=tuple(sorted(parsed.extras)),
+                       specifiers=tuple(str(x) for x in parsed.specifier),
+                       marker=str(parsed.marker) if parsed.marker else '', url=parsed.url or '')
+
+
+def format_requirement(requirement: Requirement) -> str:
+    """Write a requirement back as a requirements.txt line
+
+    Parameters
+    ----------
+    requirement : Requirement
+        Requirement to format
+
+    """
+    line = requirement.name
+    if requirement.extras:
+        line += f"[{','.join(requirement.extras)}]"
+    if requirement.url:
+        line += f' @ {requirement.url}'
+    else:
+        line += ','.join(requirement.specifiers)
+    if requirement.marker:
+        line += f'; {requirement.marker}'
+    return line
+
+
+def specifier_set(specifiers: Tuple[str, ...]) -> Optional[SpecifierSet]:
+    """Version specifiers as a packaging SpecifierSet, None if any of them can't be parsed
+
+    Parameters
+    ----------
+    specifiers : Tuple[str, ...]
+        Specifiers such as ">=1.0"
+
+    """
+    try:
+        return SpecifierSet(','.join(specifiers))
+    except InvalidSpecifier:
+        return None
+
+
+def bounds(specifiers: SpecifierSet) -> Tuple[Optional[Bound], Optional[Bound]]:
+    """Tightest lower and upper bound of a set of specifiers, None where a side is unbounded
+
+    Parameters
+    ----------
+    specifiers : SpecifierSet
+        Specifiers to combine
+
+    """
+    lower: Optional[Bound] = None
+    upper: Optional[Bound] = None
+    for specifier in specifiers:
+        if specifier.operator in ('!=', '==='):
+            # exclusions and arbitrary equality don't narrow the range
+            continue
+        version = Version(specifier.version.rstrip('.*'))
+        below: Optional[Bound] = None
+        above: Optional[Bound] = None
+        if specifier.version.endswith('*'):
+            # ==X.Y.* allows >=X.Y and <X.Y+1
+            release = version.release
+            below, above = (version, True), (Version('.'.join(map(str, release[:-1] + (release[-1] + 1,)))), False)
+        elif specifier.operator == '==':
+            below, above = (version, True), (version, True)
+        elif specifier.operator in ('>=', '>'):
+            below = (version, specifier.operator == '>=')
+        elif specifier.operator in ('<=', '<'):
+            above = (version, specifier.operator == '<=')
+        else:
+            # ~=X.Y allows >=X.Y and <X+1
+            release = version.release[:-1] if len(version.release) > 1 else version.release
+            below, above = (version, True), (Version('.'.join(map(str, release[:-1] + (release[-1] + 1,)))), False)
+        if below and (lower is None or below[0] > lower[0] or (below[0] == lower[0] and not below[1])):
+            lower = below
+        if above and (upper is None or above[0] < upper[0] or (above[0] == upper[0] and not above[1])):
+            upper = above
+    return lower, upper
+
+
+def find_conflict(existing: Requirement, new: Requirement) -> Optional[str]:
+    """Describe why two requirements for the same project can't both be satisfied
+
+    Version specifiers conflict when no version lies within all of their bounds, or
+    when the only one that does is excluded. Specifiers that can't be parsed are
+    assumed to be compatible rather than reported.
+
+    Parameters
+    ----------
+    existing : Requirement
+        Requirement already merged
+    new : Requirement
+        Requirement being merged in
+
+    Returns
+    -------
+    Optional[str]
+        None if the requirements are compatible
+
+    """
+    if existing.url and new.url and existing.url != new.url:
+        return 'different direct references'
+    combined = existing.specifiers + new.specifiers
+    if (existing.url or new.url) and combined:
+        return 'a direct reference can\'t be combined with version specifiers'
+
+    specifiers = specifier_set(combined)
+    if specifiers is None:
+        return None
+    lower, upper = bounds(specifiers)
+    if lower is None or upper is None:
+        return None
+    if lower[0] > upper[0] or (lower[0] == upper[0] and not (lower[1] and upper[1])):
+        return f"no version is {'>=' if lower[1] else '>'}{lower[0]} and {'<=' if upper[1] else '<'}{upper[0]}"
+    if lower[0] == upper[0] and not specifiers.contains(lower[0], prereleases=True):
+        return f'{lower[0]} is the only version allowed, and it is excluded'
+    return None
+
+
+def merge_requirements(sources: List[Tuple[str, str]]) -> Tuple[List[str], List[str]]:
+    """Merge and deduplicate requirements files in memory
+
+    Requirements for the same project (and environment marker) are combined into a
+    single line with the union of their extras and specifiers. When they conflict,
+    the requirement from the earlier source is kept and the conflict is reported.
+    Pip options such as --index-url, and lines that name no project (paths, archives,
+    VCS urls) are kept once as written, and so are "name @ url" direct references.
+
+    Parameters
+    ----------
+    sources : List[Tuple[str, str]]
+        (name, content) of each requirements file, in order of precedence
+
+    Returns
+    -------
+    Tuple[List[str], List[str]]
+        The merged requirements lines and a description of every conflict
+
+    """
+    merged: Dict[Tuple[str, str], Requirement] = {}
+    origins: Dict[Tuple[str, str], str] = {}
+    # line written for each requirement, or for each line that names no project
+    written: Dict[Tuple[str, str], str] = {}
+    options: List[str] = []
+    conflicts: List[str] = []
+
+    for origin, content in sources:
+        for line in requirement_lines(content):
+            if line.startswith('-'):
+                if line not in options:
+                    options.append(line)
+                continue
+            requirement = parse_requirement(line)
+            if requirement is None:
+                written.setdefault(('', line), line)
+                continue
+            key = (requirement.key, requirement.marker)
+            if key not in merged:
+                merged[key] = requirement
+                origins[key] = origin
+                written[key] = line if requirement.url else format_requirement(requirement)
+                continue
+            existing = merged[key]
+            conflict = find_conflict(existing, requirement)
+            if conflict:
+                conflicts.append(f'{format_requirement(requirement)} ({origin}) conflicts with '
+                                 f'{format_requirement(existing)} ({origins[key]}): {conflict}. Keeping the one from {origins[key]}')
+                continue
+            specifiers = existing.specifiers + tuple(x for x in requirement.specifiers if x not in existing.specifiers)
+            combined = existing._replace(extras=tuple(sorted(set(existing.extras + requirement.extras))),
+                                         specifiers=specifiers, url=existing.url or requirement.url)
+            if combined != existing:
+                merged[key] = combined
+                written[key] = line if combined == requirement else format_requirement(combined)
+
+    return options + list(written.values()), conflicts
@@ -1,22 +1,16 @@
 # Standard library imports
 import sys
 import pathlib
+import importlib
+import concurrent.futures
+import time
 
 from configparser import ConfigParser
+from typing import Dict, List, Optional, Tuple
 
 # Third party library imports
 import click
 
-from src.flask_app.setup_flask import flask, create_flask
-from src.dash.setup_dash import dash, create_dash
-from src.cicd.githubactions import create_github_actions, github_actions, lambda_workflow
-from src.cicd.circleci import cci, create_circleci
-from src.virtual_environment.virtual_environment import poetry, virtualenv, create_poetry, create_virtualenv
-from src.postgres.postgres import postgres, create_postgres
-from src.docker.docker import docker, create_docker
-from src.fastapi.setup_fastapi import fastapi, create_fastapi
-from src.ml.setup_ml import automl, fullml
-
 '''
 If any configuration settings are missing from a command invocation, program checks config.toml
 '''
@@ -30,25 +24,72 @@ CONFIG_PATH = BASE_PATH.joinpath("config.toml")
 # ============================================================= #
 
 
-@click.group()
-def easy() -> None:
-    """
-    Entry point for all easy commands
+# Extension commands are resolved to "module:command" only when invoked, so that
+# `pyrepo --help` and `pyrepo inspect` don't import every extension (and jinja2)
+EASY_COMMANDS = {
+    'flask': 'src.flask_app.setup_flask:flask',
+    'dash': 'src.dash.setup_dash:dash',
+    'cci': 'src.cicd.circleci:cci',
+    'lambda-workflow': 'src.cicd.githubactions:lambda_workflow',
+    'github-actions': 'src.cicd.githubactions:github_actions',
+    'poetry': 'src.virtual_environment.virtual_environment:poetry',
+    'virtualenv': 'src.virtual_environment.virtual_environment:virtualenv',
+    'postgres': 'src.postgres.postgres:postgres',
+    'docker': 'src.docker.docker:docker',
+    'fastapi': 'src.fastapi.setup_fastapi:fastapi',
+    'automl': 'src.ml.setup_ml:automl',
+    'fullml': 'src.ml.setup_ml:fullml',
+}
+
+
+class LazyGroup(click.Group):
+    """Click group that imports a subcommand's module the first time the subcommand is requested
+
+    Parameters
+    ----------
+    name : str
+        Name of the group on the command line
+    lazy_commands : Dict[str, str]
+        Maps each subcommand name to its import path, written as "module:attribute"
+    help : str
+        Help text for the group
+
     """
-    pass
+    def __init__(self, name: str, lazy_commands: Dict[str, str], help: str) -> None:
+        super().__init__(name=name, help=help)
+        self.lazy_commands = lazy_commands
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
 
-extensions = [
-    flask, dash, cci, lambda_workflow, github_actions, poetry, virtualenv, postgres, docker, fastapi, automl, fullml
-]
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            module_name, attribute = self.lazy_commands[cmd_name].split(':')
+            command = getattr(importlib.import_module(module_name), attribute)
+            if not isinstance(command, click.Command):
+                raise click.ClickException(f'{self.lazy_commands[cmd_name]} is not a click command')
+            self.add_command(command, cmd_name)
+        return super().get_command(ctx, cmd_name)
 
-for x in extensions:
-    easy.add_command(x)
+
+# Entry point for all easy commands
+easy = LazyGroup(name='easy', lazy_commands=EASY_COMMANDS, help='Entry point for all easy commands')
 
 
 @click.group()
-def main() -> None:
+@click.option('--timings', is_flag=True, envvar='PYREPO_TIMINGS', help='Print the wall time of each phase and component when the command finishes (or set PYREPO_TIMINGS=1)')
+@click.option('--timings-json', type=click.Path(dir_okay=False), envvar='PYREPO_TIMINGS_JSON', help='Also write the timings as JSON to this file (or set PYREPO_TIMINGS_JSON)')
+@click.pass_context
+def main(ctx: click.Context, timings: bool, timings_json: Optional[str]) -> None:
     """Setup and configure the worflows, virtual environments, and documentation of the template repo"""
-    pass
+    if timings or timings_json:
+        from src.timing.timing import report_timings
+
+        # Label the report with the command line, minus the timing options themselves
+        args = sys.argv[1:]
+        command = ' '.join(x for i, x in enumerate(args) if not x.startswith('--timings') and (i == 0 or args[i - 1] != '--timings-json'))
+        started = time.perf_counter()
+        ctx.call_on_close(lambda: report_timings(command, time.perf_counter() - started, show=timings, json_path=timings_json))
 
 # Add easy as a subgroup/subcommand under pyrepo (main)
 main.add_command(easy)
@@ -66,6 +107,42 @@ def inspect() -> None:
         sys.exit('No configuration has been set...run "pyrepo easy-setup" or "pyrepo config" to set configuration')
 
 
+@main.command()
+def wheelhouse() -> None:
+    """Builds wheels for requirements.txt into ./wheelhouse for installs without index access
+    """
+    # Imported here rather than at module level to keep CLI startup fast
+    from src.virtual_environment.virtual_environment import create_wheelhouse
+
+    click.echo('Building wheels for requirements.txt...')
+    create_wheelhouse()
+    click.echo('Wheelhouse ready in ./wheelhouse. Virtualenv, Docker and Poetry setups will now install from it offline')
+
+
+@main.command()
+@click.argument('target', required=False)
+@click.option('--profiler', type=click.Choice(['pyinstrument', 'cprofile']), default='pyinstrument', show_default=True, help='Sampling (pyinstrument) or deterministic (cprofile) profiler')
+@click.option('--duration', type=float, help='Stop the target after this many seconds, for web apps that serve until stopped')
+@click.option('--compare', nargs=2, type=click.Path(exists=True, dir_okay=False), help='Diff the hot functions of two saved JSON profiles instead of profiling')
+@click.option('--top', default=20, show_default=True, help='Number of functions shown by --compare')
+def profile(target: Optional[str], profiler: str, duration: Optional[float], compare: Optional[Tuple[str, str]], top: int) -> None:
+    """Profiles a generated entry point and writes HTML and JSON reports to reports/profiles
+
+    TARGET is the entry point relative to the repository root, such as flask/flask_app.py,
+    fastapi/fastapi_app.py, dash-basic/dash_basic_template.py or ml/ingest.py, or just its file name
+    """
+    # Imported here rather than at module level to keep CLI startup fast
+    from src.profiling.profiling import compare_profiles, profile_target
+
+    if compare:
+        for line in compare_profiles(compare[0], compare[1], top):
+            click.echo(line)
+    elif target:
+        profile_target(target, profiler, duration)
+    else:
+        sys.exit('Provide a TARGET to profile, or two saved profiles with --compare. Try pyrepo profile --help to learn more.')
+
+
 @main.command()
 @click.option('--repo', '-r', prompt='Configure template repository...\nRepository Name', help='The name of the current project')
 @click.option('--describe', '-d', prompt='Repository Description', help='The name of the current project')
@@ -91,6 +168,10 @@ def easy_setup(repo: str, describe: str) -> None:
         config.write(f)
 
     click.echo('Settings saved as config.toml')
+
+    # Imported here rather than at module level to keep CLI startup fast
+    from src.cicd.githubactions import create_github_actions
+    from src.virtual_environment.virtual_environment import create_virtualenv
     
     req_path = BASE_PATH.joinpath('requirements.txt')
 
@@ -112,9 +193,16 @@ def easy_setup(repo: str, describe: str) -> None:
 @click.option('--ecr', is_flag=True, prompt='Amazon ECR', help='Whether to include connection to Amazon ECR or not, defaults to no ecr')
 @click.option('--flask', is_flag=True, prompt='Flask Application', help='Whether to build Flask app or not, defaults to no Flask app')
 @click.option('--postgres', is_flag=True, prompt='Include Postgres with Flask', help='Whether to include Postgres database with Flask app. Defaults to no Postgres database')
+@click.option('--pgbouncer', is_flag=True, default=False, help='Connect the Flask app to Postgres through PgBouncer in transaction pooling mode. Defaults to direct connections')
+@click.option('--flask-worker-class', type=click.Choice(['gthread', 'gevent']), default='gthread', help='gunicorn worker of the Flask production server: gthread for threads, gevent for greenlets. Defaults to gthread')
 @click.option('--fastapi', is_flag=True, prompt='Include FastAPI web framework', help='Whether to include fastapi web framework. Defaults to no')
+@click.option('--fastapi-async-db', is_flag=True, default=False, help='Generate the FastAPI app with an async data layer (aiosqlite). Defaults to the sync one')
+@click.option('--fastapi-database', type=click.Choice(['sqlite', 'postgres']), default='sqlite', help='Default database of the FastAPI app, overridden at runtime by DATABASE_URL. Defaults to sqlite')
+@click.option('--fastapi-search-tokenizer', type=click.Choice(['unicode61', 'trigram']), default='unicode61', help='Tokenizer of the FastAPI search index: unicode61 matches words and prefixes, trigram any substring. Defaults to unicode61')
+@click.option('--metrics', is_flag=True, default=False, help='Generate request and database latency metrics for the web apps, served at /metrics in the Prometheus format')
 @click.option('--dash-basic', is_flag=True, prompt='Do you want a basic Dash Front End?', help='Whether to include a dash front end app')
 @click.option('--dash-gis', is_flag=True, prompt='Do you want a GIS specific Dash Front End?', help='Whether to include a GIS dash front end app')
+@click.option('--plan', '--dry-run', 'dry_run', is_flag=True, default=False, help='Print every file the configuration would generate without touching disk')
 def config(
     repo: str,
     description: str,
@@ -125,9 +213,16 @@ def config(
     ecr: bool,
     flask: bool,
     postgres: bool,
+    pgbouncer: bool,
+    flask_worker_class: str,
     fastapi: bool,
+    fastapi_async_db: bool,
+    fastapi_database: str,
+    fastapi_search_tokenizer: str,
+    metrics: bool,
     dash_basic: bool,
-    dash_gis: bool) -> None:
+    dash_gis: bool,
+    dry_run: bool) -> None:
     """Set configuration values for repository setup
 
     Parameters
@@ -141,11 +236,82 @@ def config(
     \n\necr : bool - Whether the user needs AWS ECR access or not
     \n\nflask : bool - Does the user want a flask application?
     \n\npostgres : bool - Does the user want a postgres database included with flask?
+    \n\npgbouncer : bool - Should the flask app reach postgres through PgBouncer?
+    \n\nflask_worker_class : str - gunicorn worker of the flask production server, gthread or gevent
     \n\nfastapi : bool - Does the user want a fastapi web framework?
+    \n\nfastapi_async_db : bool - Does the user want the fastapi app on an async data layer?
+    \n\nfastapi_database : str - Default database of the fastapi app, sqlite or postgres
+    \n\nfastapi_search_tokenizer : str - Tokenizer of the fastapi search index, unicode61 or trigram
+    \n\nmetrics : bool - Does the user want latency metrics at /metrics in the web apps?
     \n\ndash_basic : bool - Does the user want a dash front end app?
     \n\ndash_gis : bool - Does the user want a dash front end app with GIS?
+    \n\ndry_run : bool - Only print the plan of generated files
 
     """
+    # Imported here rather than at module level to keep CLI startup fast
+    from src.render.plan import new_plan, describe_plan, execute_plan
+    from src.flask_app.setup_flask import FLASK_SERVER, plan_flask
+    from src.dash.setup_dash import plan_dash
+    from src.cicd.githubactions import plan_github_actions
+    from src.cicd.circleci import plan_circleci
+    from src.virtual_environment.virtual_environment import plan_poetry, create_env, install_requirements
+    from src.postgres.postgres import plan_postgres
+    from src.docker.docker import plan_docker
+    from src.fastapi.setup_fastapi import FASTAPI_SERVER, plan_fastapi
+    from src.timing.timing import timed
+
+    # Plan every output file up front, nothing is rendered or written yet. Progress messages
+    # are held back until the plan is executed, a dry run only prints the planned files
+    steps: List[str] = []
+    with timed('plan'):
+        plan = new_plan()
+
+        if circleci:
+            steps.append('Creating circleci pipeline')
+            plan_circleci(plan, docker=docker, ecr=ecr)
+        else:
+            steps.append('Creating github actions workflow...')
+            plan_github_actions(plan, docker=docker)
+
+        if flask:
+            steps.append('Create flask application...')
+            plan_flask(plan, docker=docker, metrics=metrics, worker_class=flask_worker_class)
+            if postgres:
+                steps.append('Adding postgres database...')
+                plan_postgres(plan, pyversion=SYS_PY, docker=docker, flask=flask, metrics=metrics, pgbouncer=pgbouncer)
+
+        if fastapi:
+            steps.append('Setting up fastapi application')
+            plan_fastapi(plan, docker=docker, poetry=poetry, async_db=fastapi_async_db, metrics=metrics, database=fastapi_database, search_tokenizer=fastapi_search_tokenizer)
+
+        if dash_basic:
+            steps.append("Creating Basic Dash Front End")
+            plan_dash(plan, app_type="basic", pyversion=SYS_PY, docker=docker, metrics=metrics)
+
+        if dash_gis:
+            steps.append("Creating GIS Specific Dash Front End")
+            plan_dash(plan, app_type="gis", pyversion=SYS_PY, docker=docker, metrics=metrics)
+
+        if docker:
+            steps.append('You have decided to use Docker')
+            # The container serves one app, the FastAPI one when both are generated
+            server = FASTAPI_SERVER if fastapi else FLASK_SERVER if flask else None
+            plan_docker(plan, pyversion=SYS_PY, server=server)
+        elif poetry:
+            steps.append('Creating poetry environment')
+            plan_poetry(plan, repo=repo, maintain=maintain, description=description)
+        else:
+            steps.append('Creating virtual env')
+
+    if dry_run:
+        click.echo('Planned files:')
+        for line in describe_plan(plan):
+            click.echo(f'  {line}')
+        return
+
+    for step in steps:
+        click.echo(step)
+
     # Save settings to config file, overwrites any existing config
     click.echo('\nSetting config...')
     config = ConfigParser()
@@ -159,44 +325,20 @@ def config(
 
     click.echo('Settings saved as config.toml')
 
-    # Create Infrastructure
-    if circleci:
-        click.echo('Creating circleci pipeline')
-        create_circleci(docker=docker, ecr=ecr)
-    else:
-        click.echo('Creating github actions workflow...')
-        create_github_actions(docker=docker)
-
-    if flask:
-        click.echo('Create flask application...')
-        create_flask(docker=docker)
-        if postgres:
-            click.echo('Adding postgres database...')
-            create_postgres(pyversion=SYS_PY, docker=docker, flask=flask)
-    
-    if fastapi:
-        click.echo('Setting up fastapi application')
-        create_fastapi(docker=docker, poetry=poetry)
-
-    if dash_basic:
-        click.echo("Creating Basic Dash Front End")
-        create_dash(app_type="basic", pyversion=SYS_PY, docker=docker)
-
-    if dash_gis:
-        click.echo("Creating GIS Specific Dash Front End")
-        create_dash(app_type="gis", pyversion=SYS_PY, docker=docker)
-    
-    if docker:
-        click.echo('You have decided to use Docker')
-        create_docker(pyversion=SYS_PY)
-    elif poetry:
-        click.echo('Creating poetry environment')
-        create_poetry(repo=repo, maintain=maintain, description=description)
+    if docker or poetry:
+        execute_plan(plan)
     else:
-        click.echo('Creating virtual env')
-        # Keep virtual environment config at the end of this list of if/else statements to
-        # install the latest requirements.txt into the virtual environment
-        create_virtualenv(pyversion=SYS_PY)
+        # Create the virtual environment while the plan renders. Requirements are installed
+        # at the end of the run, once the final requirements.txt has been written
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            venv = pool.submit(create_env, SYS_PY, BASE_PATH)
+            execute_plan(plan)
+            venv.result()
+        click.echo('Creating virtual environment and installing requirements...')
+        if BASE_PATH.joinpath('requirements.txt').exists():
+            status = install_requirements()
+            if status != 0:
+                sys.exit(status)
     
     click.echo('Repository Setup Complete')
     click.echo('Feel free to delete templates folder')
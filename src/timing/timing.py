@@ -0,0 +1,114 @@
+import click
+import contextlib
+import datetime
+import hashlib
+import json
+import pathlib
+import sys
+import time
+from typing import Iterator, List, NamedTuple, Optional
+
+BASE_PATH = pathlib.Path.cwd()
+
+
+class PhaseTiming(NamedTuple):
+    """Wall time of one phase of a pyrepo command
+
+    Parameters
+    ----------
+    phase : str
+        What was timed, such as render, write, venv or pip install
+    component : str
+        Which template, file or command the phase worked on
+    seconds : float
+        Wall time in seconds
+
+    """
+    phase: str
+    component: str
+    seconds: float
+
+
+# Every phase timed in this process, recording is cheap so it is always on
+TIMINGS: List[PhaseTiming] = []
+
+
+@contextlib.contextmanager
+def timed(phase: str, component: str = '') -> Iterator[None]:
+    """Record the wall time of the enclosed block as a phase
+
+    Parameters
+    ----------
+    phase : str
+        What is being timed
+    component : str
+        Which template, file or command the phase works on
+
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        TIMINGS.append(PhaseTiming(phase=phase, component=component, seconds=time.perf_counter() - start))
+
+
+def format_timings(timings: List[PhaseTiming]) -> List[str]:
+    """Lay out timings as a text table, slowest phase first
+
+    Parameters
+    ----------
+    timings : List[PhaseTiming]
+        Timings to format
+
+    """
+    rows = sorted(timings, key=lambda x: x.seconds, reverse=True)
+    phase_width = max([len('Phase')] + [len(x.phase) for x in rows])
+    component_width = max([len('Component')] + [len(x.component) for x in rows])
+    lines = [f"{'Phase':<{phase_width}}  {'Component':<{component_width}}  {'Seconds':>8}"]
+    lines.append('-' * len(lines[0]))
+    lines.extend(f'{x.phase:<{phase_width}}  {x.component:<{component_width}}  {x.seconds:>8.3f}' for x in rows)
+    return lines
+
+
+def templates_hash() -> str:
+    """sha256 of every template, identifies the template version the timings were taken with
+    """
+    digest = hashlib.sha256()
+    for path in sorted(BASE_PATH.joinpath('templates').glob('*')):
+        if path.is_file():
+            digest.update(path.name.encode('utf-8'))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def report_timings(command: str, total_seconds: float, show: bool, json_path: Optional[str]) -> None:
+    """Print the recorded timings as a table and/or write them as JSON
+
+    Parameters
+    ----------
+    command : str
+        The pyrepo command that was timed
+    total_seconds : float
+        Wall time of the whole command
+    show : bool
+        Print the table
+    json_path : Optional[str]
+        Where to write the timings as JSON, if anywhere
+
+    """
+    if show and TIMINGS:
+        click.echo(f'\nTimings for pyrepo {command} (render phases run concurrently, so they can add up to more than the wall time)')
+        for line in format_timings(TIMINGS):
+            click.echo(line)
+        click.echo(f'Total wall time: {total_seconds:.3f} s')
+    if json_path:
+        report = {
+            'command': command,
+            'recorded_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': f"{sys.version_info.major}.{sys.version_info.minor}",
+            'templates_sha256': templates_hash(),
+            'total_seconds': total_seconds,
+            'timings': [x._asdict() for x in TIMINGS],
+        }
+        with open(json_path, 'w') as file:
+            json.dump(report, file, indent=2)
@@ -1,14 +1,23 @@
 import click
-from src.functions import create_template_env
+from src.render.plan import RenderPlan, add_file, execute_plan, new_plan
+from src.requirements.requirements import parse_requirement, requirement_lines
+from src.timing.timing import timed
 import sys
 import pathlib
 import platform
 import subprocess as sp
 import os
+import hashlib
+import json
+from typing import Dict, List, Tuple
 
 SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
 BASE_PATH = pathlib.Path.cwd()
 CONFIG_PATH = BASE_PATH.joinpath("config.toml")
+ENV_PATH = BASE_PATH.joinpath('env')
+# Fingerprint of the requirements last installed into ./env
+FINGERPRINT_PATH = ENV_PATH.joinpath('pyrepo_requirements.json')
+WHEELHOUSE_PATH = BASE_PATH.joinpath('wheelhouse')
 
 
 def create_env(pyversion: str, exec_path: os.PathLike) -> None:
@@ -20,20 +29,221 @@ def create_env(pyversion: str, exec_path: os.PathLike) -> None:
     exec_path : pathlike object
         where to execute call command
     """
+    # An existing environment is reused, install_requirements brings its packages up to date
+    if ENV_PATH.joinpath('pyvenv.cfg').exists():
+        click.echo('Reusing existing virtual environment in ./env')
+        return
 
     try:
-        sp.run([sys.executable, '-m', 'venv', 'env'], check=True)
+        with timed('venv', 'python -m venv env'):
+            sp.run([sys.executable, '-m', 'venv', str(ENV_PATH)], check=True)
     except Exception as e:
         click.echo('Error Occurred')
         click.echo(e)
 
 
-def activate_and_run(command: str) -> None:
+def env_scripts() -> pathlib.Path:
+    """Folder holding the executables of the virtual environment in ./env
+    """
+    return ENV_PATH.joinpath('Scripts' if platform.system() == 'Windows' else 'bin')
+
+
+def env_python() -> str:
+    """Interpreter of the virtual environment in ./env, or the one running pyrepo if there is none
+    """
+    python = env_scripts().joinpath('python.exe' if platform.system() == 'Windows' else 'python')
+    return str(python) if python.exists() else sys.executable
+
+
+def env_executable(name: str) -> str:
+    """Path of an executable installed in ./env, or the bare name to look it up on PATH
+
+    Parameters
+    ----------
+    name : str
+        Executable name, such as python, pip or dvc
+
+    """
+    if name == 'python':
+        return env_python()
+    for candidate in (env_scripts().joinpath(name), env_scripts().joinpath(f'{name}.exe')):
+        if candidate.exists():
+            return str(candidate)
+    return name
+
+
+def env_variables() -> Dict[str, str]:
+    """Environment variables of an activated ./env: VIRTUAL_ENV set and its executables first on PATH
+    """
+    variables = dict(os.environ)
+    if ENV_PATH.joinpath('pyvenv.cfg').exists():
+        variables['VIRTUAL_ENV'] = str(ENV_PATH)
+        variables['PATH'] = str(env_scripts()) + os.pathsep + variables.get('PATH', '')
+        variables.pop('PYTHONHOME', None)
+    return variables
+
+
+def run_in_env(args: List[str]) -> int:
+    """Run a command with the executables of ./env, without starting a shell to activate it
+
+    Output is streamed as the command produces it.
+
+    Parameters
+    ----------
+    args : List[str]
+        Command and its arguments, the command is resolved with env_executable
+
+    Returns
+    -------
+    int
+        Exit status of the command, 127 if it could not be found
+
+    """
+    command = [env_executable(args[0])] + args[1:]
+    try:
+        return sp.run(command, cwd=BASE_PATH, env=env_variables()).returncode
+    except FileNotFoundError:
+        click.echo(f'{args[0]} was not found in ./env or on PATH')
+        return 127
+
+
+def requirements_fingerprint(requirements: List[str]) -> str:
+    """Fingerprint of a set of requirements, independent of their order
+
+    Parameters
+    ----------
+    requirements : List[str]
+        Normalized requirements lines
+
+    """
+    return hashlib.sha256('\n'.join(sorted(requirements)).encode('utf-8')).hexdigest()
+
+
+def load_fingerprint() -> Tuple[str, List[str]]:
+    """Fingerprint and requirements last installed into ./env, empty if nothing was recorded
+    """
+    try:
+        with open(FINGERPRINT_PATH, 'r') as file:
+            installed = json.load(file)
+        return str(installed['fingerprint']), [str(x) for x in installed['requirements']]
+    except (OSError, ValueError, KeyError, TypeError):
+        return '', []
+
+
+def save_fingerprint(requirements: List[str]) -> None:
+    """Record the requirements installed into ./env
+
+    Parameters
+    ----------
+    requirements : List[str]
+        Normalized requirements lines
+
+    """
+    with open(FINGERPRINT_PATH, 'w') as file:
+        json.dump({'fingerprint': requirements_fingerprint(requirements), 'requirements': requirements}, file, indent=2)
+
+
+def has_wheelhouse() -> bool:
+    """Whether `pyrepo wheelhouse` has filled the local wheel directory
+    """
+    return WHEELHOUSE_PATH.is_dir() and any(WHEELHOUSE_PATH.glob('*.whl'))
+
+
+def create_wheelhouse() -> None:
+    """Build wheels for every requirement in requirements.txt into ./wheelhouse
+
+    The wheels are built with the interpreter running pyrepo, which is also the one
+    the virtual environment is created from. The generated Dockerfile runs Linux with
+    the same python version, so wheels built on another platform may not fit it; it
+    then falls back to the package index for those.
+    """
+    if platform.system() != 'Linux':
+        click.echo(f'Building wheels for {platform.system()}. Docker images run Linux and will download the platform specific packages from the index')
+    WHEELHOUSE_PATH.mkdir(exist_ok=True)
+    try:
+        with timed('pip wheel', 'requirements.txt'):
+            sp.run([sys.executable, '-m', 'pip', 'wheel', '-r', 'requirements.txt', '--wheel-dir', str(WHEELHOUSE_PATH)], check=True)
+    except sp.CalledProcessError as e:
+        sys.exit(f'Building the wheelhouse failed: {e}')
+
+
+def pip_install(requirements_file: str) -> int:
+    """Install a requirements file into the virtual environment in ./env
+
+    When ./wheelhouse has been filled, packages are installed from it without
+    any package index access.
+
+    Parameters
+    ----------
+    requirements_file : str
+        Path of the requirements file, relative to the repository root
+
+    Returns
+    -------
+    int
+        Exit status of pip
+
+    """
+    # Never fall back to the interpreter running pyrepo, that would install into it
+    if not ENV_PATH.joinpath('pyvenv.cfg').exists():
+        click.echo('No virtual environment found in ./env to install requirements into')
+        return 1
+
+    options: List[str] = []
+    if has_wheelhouse():
+        click.echo('Installing from ./wheelhouse without package index access')
+        options = ['--no-index', '--find-links', WHEELHOUSE_PATH.name]
+
+    with timed('pip install', requirements_file):
+        return run_in_env(['python', '-m', 'pip', 'install'] + options + ['-r', requirements_file])
+
+
+def install_requirements() -> int:
+    """Install requirements.txt into the virtual environment in ./env
+
+    The environment keeps a fingerprint of the requirements it was set up with. If
+    requirements.txt still matches it, pip is not run at all; otherwise pip installs
+    the whole file, which only downloads and installs the added or changed
+    requirements and resolves them together with the ones already installed.
+    Packages of requirements removed from requirements.txt are not uninstalled, they
+    are listed and stay in ./env until it is deleted and created again.
+
+    Returns
+    -------
+    int
+        Exit status of pip, 0 when there was nothing to install
+
+    """
+    requirements = requirement_lines(BASE_PATH.joinpath('requirements.txt').read_text())
+    fingerprint, installed = load_fingerprint()
+
+    status = 0
+    if fingerprint == requirements_fingerprint(requirements):
+        click.echo('Virtual environment already has the requirements in requirements.txt, skipping pip install')
+    else:
+        if installed:
+            changed = [x for x in requirements if not x.startswith('-') and x not in installed]
+            if changed:
+                click.echo(f"Installing added or changed requirements: {', '.join(changed)}")
+
+        # pip can't tell which of their dependencies are still needed, so nothing is uninstalled
+        projects = {x.key for x in map(parse_requirement, requirements) if x}
+        removed = [x.name for x in map(parse_requirement, installed) if x and x.key not in projects]
+        if removed:
+            click.echo(f"No longer in requirements.txt but still installed: {', '.join(removed)}. Delete ./env to set it up without them")
+
+        status = pip_install('requirements.txt')
+        if status == 0:
+            save_fingerprint(requirements)
+        else:
+            click.echo('pip install failed, requirements will be installed again on the next run')
+
     if platform.system() == 'Linux':
-        os.system(". env/bin/activate && " + command)
+        click.echo("Activate Virtual Environment with source env/bin/activate. Use deactivate to exit virtual environment")
     elif platform.system() == 'Windows':
-        os.system("cd /d env\\Scripts & activate.bat & cd /d ..\\.. & " + command)
-    
+        click.echo("Activate Virtual Environment with .\env\Scripts\Activate.ps1 or if using command prompt use .\env\Scripts\\activate.bat. Use deactivate to exit virtual environment")
+    return status
+
 
 def create_virtualenv(pyversion: str) -> None:
     """Set up venv virtual environment
@@ -49,27 +259,34 @@ def create_virtualenv(pyversion: str) -> None:
     if req_path.exists():
         # Create the virtual environment
         create_env(pyversion, BASE_PATH)
-      
-        if platform.system() == 'Linux':
-            try:
-                os.system(". env/bin/activate && pip install -r requirements.txt")
-                click.echo("Activate Virtual Environment with source env/bin/activate. Use deactivate to exit virtual environment")
-            except Exception as e:
-                sys.exit(e)
-        elif platform.system() == 'Windows':
-            try:
-                os.system("cd /d env\\Scripts & activate.bat & cd /d ..\\.. & python -m pip install -r requirements.txt")
-                click.echo("Activate Virtual Environment with .\env\Scripts\Activate.ps1 or if using command prompt use .\env\Scripts\\activate.bat. Use deactivate to exit virtual environment")
-            except Exception as e:
-                sys.exit(e)
-        else:
-            sys.exit('System not recognized, exiting setup')
+        status = install_requirements()
+        if status != 0:
+            sys.exit(status)
     else:
         # If requirements.txt does not exist, make only a basic environment
         click.echo('No requirements.txt file detected, creating basic virtualenv environment')
         create_env(pyversion, BASE_PATH)
 
 
+def plan_poetry(plan: RenderPlan, repo: str, maintain: str, description: str) -> None:
+    """Add the poetry config to a render plan
+    Parameters
+    ----------
+    plan : RenderPlan
+        Plan to extend
+    repo : str
+        Repository name
+    maintain : str
+        Repository Maintainer
+    description : str
+        Repository description
+
+    """
+    env_path = BASE_PATH.joinpath('pyproject.toml')
+    wheelhouse = WHEELHOUSE_PATH.name if has_wheelhouse() else ''
+    add_file(plan, 'pyproject_template.toml', env_path, {'repo': repo, 'pyversion': SYS_PY, 'author': maintain, 'description': description, 'wheelhouse': wheelhouse})
+
+
 def create_poetry(repo: str, maintain: str, description: str) -> None:
     """Creates poetry config
     Parameters
@@ -82,18 +299,11 @@ def create_poetry(repo: str, maintain: str, description: str) -> None:
         Repository description
 
     """
-    # Load Jinja environment and grab templates
     click.echo('Creating poetry environment...')
-    
-    env = create_template_env()
 
-    template = env.get_template('pyproject_template.toml')
-    # Render config file
-    output = template.render(repo=repo, pyversion=SYS_PY, author=maintain, description=description)
-    # Save rendered file to disk
-    env_path = BASE_PATH.joinpath('pyproject.toml')
-    with open(env_path, 'w') as file:
-        file.write(output)
+    plan = new_plan()
+    plan_poetry(plan, repo=repo, maintain=maintain, description=description)
+    execute_plan(plan)
 
     click.echo('Poetry environment created. Add dependencies manually or use `cat requirements.txt|xargs poetry add` on Linux')
 
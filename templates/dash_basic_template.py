@@ -7,6 +7,16 @@ import pandas as pd
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+# The underlying flask app, for WSGI servers and `pyrepo profile`
+server = app.server
+
+# Request latency metrics at /metrics, when the app was generated with --metrics
+try:
+    from metrics import instrument_flask
+except ImportError:
+    pass
+else:
+    instrument_flask(server)
 
 # assume you have a "long-form" data frame
 # see https://plotly.com/python/px-arguments/ for more options
@@ -61,6 +61,16 @@ controls = dbc.Card([
 
 # Initializing and organizing application layout
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+# The underlying flask app, for WSGI servers and `pyrepo profile`
+server = app.server
+
+# Request latency metrics at /metrics, when the app was generated with --metrics
+try:
+    from metrics import instrument_flask
+except ImportError:
+    pass
+else:
+    instrument_flask(server)
 app.layout = dbc.Container([
     html.H1('Dash GIS Example App'),
     html.Hr(),
@@ -1,23 +1,58 @@
 import os
-import fastapi_models as models
+import fastapi_crud as crud
 from fastapi_models import Cities
-from fastapi import FastAPI, Request, Depends, BackgroundTasks
+from fastapi import FastAPI, Request, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi.templating import Jinja2Templates
-from fastapi_database import SessionLocal, engine
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-import requests
-from pydantic import BaseModel
-from starlette.responses import RedirectResponse
-from typing import Generator, Optional, Iterable, Dict
-import json
-
-app = FastAPI()
-
-models.Base.metadata.create_all(bind=engine)
-
-templates = Jinja2Templates(directory="")
+from fastapi_database import create_tables, run, warm_up
+from fastapi_time import time_provider
+from fastapi_jobs import JobQueue
+from fastapi_cache import ResponseCache, cache_backend, conditional_response
+from pydantic import BaseModel, ConfigDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Dict, Sequence, Tuple
+
+# Rows per page of the home route and GET /cities, and per database batch of a streamed response
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Most cities a single bulk request may carry, send larger loads in chunks
+MAX_BULK_SIZE = 10000
+
+# Local tz database, or a worldtimeapi compatible service when TIME_API_URL is set
+clock = time_provider()
+
+# Responses of the read routes, cleared by every write. In memory for a single server
+# process, in redis when CACHE_URL is set, not cached with several processes and no CACHE_URL
+cache = ResponseCache(cache_backend())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    '''
+    create the database tables, warm up and start the job workers before serving,
+    finish the queued jobs and release the time provider after
+    '''
+    await create_tables()
+    #open database connections and compile the page template ahead of the first request
+    await warm_up()
+    templates.get_template("fastapi_home.html")
+    jobs.start()
+    yield
+    await jobs.drain()
+    await clock.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+# Request latency metrics at /metrics, when the app was generated with --metrics
+try:
+    from metrics import instrument_fastapi
+except ImportError:
+    pass
+else:
+    instrument_fastapi(app)
+
+# The html templates sit next to this file
+templates = Jinja2Templates(directory=os.path.dirname(os.path.abspath(__file__)))
 
 #base model data structure
 class CityRequest(BaseModel):
@@ -31,127 +66,214 @@ class CityUpdate(BaseModel):
     newname: str
     newtimezone: str
 
-#connect to database
-def get_db() -> Generator:
-    try:
-        db=SessionLocal()
-        yield db
-    finally:
-        db.close()
+# Response models. Routes declare them as their return type, so FastAPI validates
+# the result once and pydantic serializes it straight to JSON bytes
+class CityOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
 
-@app.get('/')
-def home(request: Request, timezone: Optional[str]=None, db: Session = Depends(get_db)) -> object:
-    '''
-    show all cities on home route
-    '''
-    
-    city = db.query(Cities)
+    id: int
+    name: str
+    timezone: str
+    time: Optional[str] = None
+
+class CityPage(BaseModel):
+    items: List[CityOut]
+    next: Optional[int]
 
-    if timezone:
-        city = city.filter(Cities.timezone == timezone)
+class SearchPage(BaseModel):
+    items: List[CityOut]
+    next: Optional[int]
 
-    city = city.all()
+class Message(BaseModel):
+    code: str
+    message: str
 
-    return templates.TemplateResponse(
-        "fastapi_home.html", {
-        "request": request,
-        "city": city,
-        "timezone": timezone
-    })
+class BulkCreated(Message):
+    ids: List[int]
 
-def fetch_time(id: int) -> None:
+class BulkCount(Message):
+    count: int
+
+class JobStats(BaseModel):
+    depth: int
+    capacity: int
+    workers: int
+    processed: int
+    failed: int
+    batches: int
+    retries: int
+    in_flight: int
+
+async def fetch_page(timezone: Optional[str], after: int, limit: int) -> Tuple[List[Cities], Optional[int]]:
+    '''
+    a page of cities after the id `after`, and the id the next page starts after (None on the last page)
+    '''
+    #one extra row tells whether there is a next page
+    rows = await run(lambda db: crud.list_cities(db, timezone, after, limit + 1))
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+async def stream_cities(timezone: Optional[str], after: Optional[int], batch: int) -> AsyncIterator[bytes]:
     '''
-    fetch time in that city
+    every city after the id `after` as NDJSON, read from the database one batch at a time
     '''
-    db = SessionLocal()
-    
-    #query database on city ID
-    city = db.query(Cities).filter(Cities.id == id).first()
+    while after is not None:
+        rows, after = await fetch_page(timezone, after, batch)
+        yield "".join(CityOut.model_validate(city).model_dump_json() + "\n" for city in rows).encode()
 
-    r = requests.get(f'http://worldtimeapi.org/api/timezone/{city.timezone}')    
-    current_time = r.json()['datetime']
+@app.get('/')
+async def home(request: Request, timezone: Optional[str]=None, after: int=0) -> Response:
+    '''
+    show a page of cities on home route, cached until the next write
+    '''
+    async def render() -> Tuple[bytes, str]:
+        city, next_after = await fetch_page(timezone, after, PAGE_SIZE)
+        html = templates.get_template("fastapi_home.html").render({
+            "city": city,
+            "timezone": timezone,
+            "after": after,
+            "next_after": next_after
+        })
+        return html.encode(), "text/html"
+
+    return conditional_response(request, await cache.get_or_build(f"home:{timezone or ''}:{after}", render))
+
+async def fetch_times(cities: List[Tuple[int, str]]) -> None:
+    '''
+    fetch time in many (id, timezone) cities, looking each timezone up once
+    '''
+    times: Dict[str, Optional[str]] = {}
+    for _, timezone in cities:
+        if timezone not in times:
+            times[timezone] = await clock.current_time(timezone)
 
-    city.time = current_time
+    #add in times
+    found = [(id, time) for id, time in ((id, times[timezone]) for id, timezone in cities) if time is not None]
+    await run(lambda db: crud.set_times(db, found))
+    await cache.invalidate()
 
-    #add in time
-    db.add(city)
-    db.commit()
+# Time fetches of new cities, queued cities are fetched and stored together in batches
+jobs: JobQueue[Tuple[int, str]] = JobQueue(fetch_times)
+
+def check_bulk_size(items: Sequence[BaseModel]) -> None:
+    '''
+    reject bulk requests over MAX_BULK_SIZE
+    '''
+    if len(items) > MAX_BULK_SIZE:
+        raise HTTPException(status_code=413, detail=f"at most {MAX_BULK_SIZE} cities per request")
 
 @app.post('/cities')
-async def create_city(city_request: CityRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)) -> Dict[str,str]:
+async def create_city(city_request: CityRequest) -> Message:
     '''
     creates city and stores in database
-    dependency: database connection
-    runs background task asynchronously
+    queues fetching its time
     '''
-    city = Cities()
-    city.name = city_request.name
-    city.timezone = city_request.timezone
-    db.add(city)
-    db.commit()
+    city = await run(lambda db: crud.create_city(db, city_request.name, city_request.timezone))
+
+    await cache.invalidate()
 
     #fetch time in background
-    background_tasks.add_task(fetch_time, city.id)
+    await jobs.submit([(city.id, city.timezone)])
+
+    return Message(code="success", message="city added to database")
 
-    return {
-        "code": "success",
-        "message": "city added to database"
-    }
+@app.get('/cities', response_model=CityPage)
+async def get_cities(request: Request, timezone: Optional[str]=None, after: int=0, limit: int=Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), stream: bool=False) -> Response:
+    '''
+    a page of cities in id order, pass the returned `next` as `after` to get the following page.
+    pages are cached until the next write and carry an ETag, send it back in If-None-Match to get a 304.
+    with stream=true, every city after `after` is sent as NDJSON, read from the database `limit` rows at a time
+    '''
+    if stream:
+        return StreamingResponse(stream_cities(timezone, after, limit), media_type="application/x-ndjson")
 
-@app.get('/cities')
-def get_cities(db: Session = Depends(get_db)) -> Iterable[str]:
+    async def serialize() -> Tuple[bytes, str]:
+        cities, next_after = await fetch_page(timezone, after, limit)
+        return CityPage(items=cities, next=next_after).model_dump_json().encode(), "application/json"
 
-    cities = db.query(Cities).all()
+    return conditional_response(request, await cache.get_or_build(f"cities:{timezone or ''}:{after}:{limit}", serialize))
 
-    json_cities = jsonable_encoder(cities)
+@app.get('/cities/search', response_model=SearchPage)
+async def search_cities(request: Request, q: str=Query(min_length=1, max_length=200), offset: int=Query(0, ge=0), limit: int=Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)) -> Response:
+    '''
+    a page of the cities whose name or timezone match `q`, best match first.
+    pass the returned `next` as `offset` to get the following page. cached like GET /cities
+    '''
+    async def serialize() -> Tuple[bytes, str]:
+        #one extra row tells whether there is a next page
+        cities = await run(lambda db: crud.search_cities(db, q, limit + 1, offset))
+        next_offset = offset + limit if len(cities) > limit else None
+        return SearchPage(items=cities[:limit], next=next_offset).model_dump_json().encode(), "application/json"
 
-    return {
-        json.dumps(json_cities)
-    }
+    return conditional_response(request, await cache.get_or_build(f"search:{offset}:{limit}:{q}", serialize))
 
 @app.delete('/cities')
-def delete_city(city_request: CityRequest, db: Session = Depends(get_db)) -> Dict[str,str]:
+async def delete_city(city_request: CityRequest) -> Message:
     '''
     deletes city by finding first city and timezone with that name
     '''
-    
-    name = city_request.name
-    timezone = city_request.timezone
-
-    city = db.query(Cities).filter(and_(Cities.name == name, Cities.timezone == timezone)).first()
-    db.delete(city)
-    db.commit()
+    if not await run(lambda db: crud.delete_city(db, city_request.name, city_request.timezone)):
+        raise HTTPException(status_code=404, detail="city not found")
+    await cache.invalidate()
 
-    return {
-        "code":"success",
-        "message":"city deleted from database"
-        }
+    return Message(code="success", message="city deleted from database")
 
 @app.post('/update')
-def update_city(city_update: CityUpdate, db: Session = Depends(get_db)) -> Dict[str,str]:
+async def update_city(city_update: CityUpdate) -> Message:
     '''
     updates timezone by finding first city with that name
     '''
+    if not await run(lambda db: crud.update_city(db, city_update.name, city_update.timezone, city_update.newname, city_update.newtimezone)):
+        raise HTTPException(status_code=404, detail="city not found")
+    await cache.invalidate()
 
-    name = city_update.name
-    timezone = city_update.timezone
+    return Message(code="success", message="city updated in database")
 
-    newname = city_update.newname
-    newzone = city_update.newtimezone
+@app.post('/cities/bulk')
+async def create_cities(city_requests: List[CityRequest]) -> BulkCreated:
+    '''
+    creates many cities in one transaction
+    '''
+    check_bulk_size(city_requests)
+    ids = await run(lambda db: crud.create_cities(db, [(x.name, x.timezone) for x in city_requests]))
+    await cache.invalidate()
+
+    #fetch times in background
+    await jobs.submit([(id, x.timezone) for id, x in zip(ids, city_requests)])
 
-    city = db.query(Cities).filter(and_(Cities.name == name, Cities.timezone == timezone)).first()
+    return BulkCreated(code="success", message=f"{len(ids)} cities added to database", ids=ids)
+
+@app.delete('/cities/bulk')
+async def delete_cities(city_requests: List[CityRequest]) -> BulkCount:
+    '''
+    deletes the first city with each name and timezone, in one transaction
+    '''
+    check_bulk_size(city_requests)
+    deleted = await run(lambda db: crud.delete_cities(db, [(x.name, x.timezone) for x in city_requests]))
+    await cache.invalidate()
 
-    city.name = newname
+    return BulkCount(code="success", message=f"{deleted} cities deleted from database", count=deleted)
 
-    city.timezone = newzone
+@app.post('/update/bulk')
+async def update_cities(city_updates: List[CityUpdate]) -> BulkCount:
+    '''
+    updates the first city with each name and timezone, in one transaction
+    '''
+    check_bulk_size(city_updates)
+    updated = await run(lambda db: crud.update_cities(db, [(x.name, x.timezone, x.newname, x.newtimezone) for x in city_updates]))
+    await cache.invalidate()
 
-    db.commit()
+    return BulkCount(code="success", message=f"{updated} cities updated in database", count=updated)
 
-    return {
-        "code":"success",
-        "message":"city updated in database"
-        }
+@app.get('/jobs')
+async def job_stats() -> JobStats:
+    '''
+    depth of the background job queue and how many jobs ran, failed or were retried
+    '''
+    return JobStats(**jobs.stats())
 
 if __name__ == "__main__":
+    #development server, reloads on code changes. Serve production with fastapi_gunicorn.py
     print("Check http://127.0.0.1:8000/redoc OR \n http://127.0.0.1:8000/docs to play around!")
-    os.system("uvicorn fastapi_app:app --reload")
\ No newline at end of file
+    os.system("uvicorn fastapi_app:app --reload")
@@ -0,0 +1,81 @@
+'''
+Compare per-row and bulk writes against a running app:
+
+    python fastapi_bulk_benchmark.py --url http://127.0.0.1:8000 --cities 2000
+
+Every step creates, renames and deletes the same cities twice: once with a request per
+city (POST /cities, POST /update, DELETE /cities) and once with the bulk endpoints,
+which send up to --batch cities per request and write each batch in one transaction.
+'''
+import argparse
+import time
+from typing import Dict, List
+
+import httpx
+
+BulkBody = List[Dict[str, str]]
+
+STEPS = ["create", "update", "delete"]
+ROW_ENDPOINTS = [("POST", "/cities"), ("POST", "/update"), ("DELETE", "/cities")]
+BULK_ENDPOINTS = [("POST", "/cities/bulk"), ("POST", "/update/bulk"), ("DELETE", "/cities/bulk")]
+
+
+def chunks(items: BulkBody, size: int) -> List[BulkBody]:
+    '''
+    items split into lists of at most `size`
+    '''
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def timed(client: httpx.Client, method: str, path: str, bodies: List[BulkBody]) -> float:
+    '''
+    send each body in turn, return the seconds it took
+    '''
+    start = time.perf_counter()
+    for body in bodies:
+        client.request(method, path, json=body).raise_for_status()
+    return time.perf_counter() - start
+
+
+def timed_rows(client: httpx.Client, method: str, path: str, rows: BulkBody) -> float:
+    '''
+    send a request per row, return the seconds it took
+    '''
+    start = time.perf_counter()
+    for row in rows:
+        client.request(method, path, json=row).raise_for_status()
+    return time.perf_counter() - start
+
+
+def requests_for(prefix: str, count: int) -> List[BulkBody]:
+    '''
+    bodies creating, renaming and deleting `count` new cities
+    '''
+    cities = [{"name": f"{prefix}-{i}", "timezone": "Etc/UTC"} for i in range(count)]
+    renames = [{**city, "newname": city["name"] + "-renamed", "newtimezone": "Etc/GMT"} for city in cities]
+    renamed = [{"name": city["newname"], "timezone": city["newtimezone"]} for city in renames]
+    return [cities, renames, renamed]
+
+
+def main(url: str, count: int, batch: int) -> None:
+    with httpx.Client(base_url=url, timeout=300) as client:
+        rows = requests_for(f"bench-row-{time.time_ns()}", count)
+        row_times = [timed_rows(client, method, path, body)
+                     for (method, path), body in zip(ROW_ENDPOINTS, rows)]
+
+        bulk = requests_for(f"bench-bulk-{time.time_ns()}", count)
+        bulk_times = [timed(client, method, path, chunks(body, batch))
+                      for (method, path), body in zip(BULK_ENDPOINTS, bulk)]
+
+    print(f"{'step':<8}{'cities':>8}{'per-row s':>12}{'bulk s':>10}{'speedup':>10}")
+    for step, row_time, bulk_time in zip(STEPS, row_times, bulk_times):
+        print(f"{step:<8}{count:>8}{row_time:>12.2f}{bulk_time:>10.2f}{row_time / bulk_time:>9.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-row and bulk writes of the cities API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--cities", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+    main(args.url, args.cities, args.batch)
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, NamedTuple, Optional, Protocol, Set, Tuple
+
+from fastapi import Request, Response
+
+# How long a cached response may be served, writes clear it sooner
+CACHE_TTL_SECONDS = 30
+# Most responses kept in memory, the least recently used go first
+CACHE_MAX_ENTRIES = 1024
+# redis://host:port/db of a cache shared by every server process, e.g. redis://localhost:6379/0
+CACHE_URL = os.getenv("CACHE_URL")
+# Server processes running the app, exported by fastapi_gunicorn.py
+WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    media_type: str
+    etag: str
+
+
+class CacheBackend(Protocol):
+    '''
+    where cached responses live. Every write bumps the generation, entries of an older
+    generation are never served. A backend shared by all server processes keeps them in step
+    '''
+
+    async def get(self, key: str) -> Tuple[int, Optional[CachedResponse]]:
+        '''
+        the current generation, and the entry for `key` if it is of that generation
+        '''
+        ...
+
+    async def set(self, key: str, value: CachedResponse, generation: int) -> None:
+        '''
+        store an entry built from the data of `generation`, unless a write has bumped it since
+        '''
+        ...
+
+    async def clear(self) -> None:
+        '''
+        bump the generation, dropping every entry
+        '''
+        ...
+
+
+class MemoryBackend:
+    '''
+    in-process LRU cache whose entries expire after `ttl` seconds. Only a write through this
+    process clears it, so it suits a single server process
+    '''
+
+    def __init__(self, maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        # key -> (monotonic expiry, response), least recently used first
+        self.entries: "OrderedDict[str, Tuple[float, CachedResponse]]" = OrderedDict()
+
+    async def get(self, key: str) -> Tuple[int, Optional[CachedResponse]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return self.generation, None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return self.generation, None
+        self.entries.move_to_end(key)
+        return self.generation, entry[1]
+
+    async def set(self, key: str, value: CachedResponse, generation: int) -> None:
+        if generation != self.generation:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    async def clear(self) -> None:
+        self.generation += 1
+        self.entries.clear()
+
+
+class RedisBackend:
+    '''
+    cache in redis, shared by every server process: a write through any of them clears it
+    for all. Entries expire after `ttl` seconds, redis evicts them under its maxmemory policy.
+    Needs the redis package
+    '''
+
+    def __init__(self, url: str, ttl: float = CACHE_TTL_SECONDS, prefix: str = "cities-cache:") -> None:
+        from redis.asyncio import Redis
+        from redis.exceptions import RedisError
+
+        self.client = Redis.from_url(url)
+        self.errors = RedisError
+        self.ttl = ttl
+        self.prefix = prefix
+        self.generation_key = prefix + "generation"
+
+    async def get(self, key: str) -> Tuple[int, Optional[CachedResponse]]:
+        # one round trip for the generation and the entry, an entry of an older one is a miss
+        try:
+            generation, entry = await self.client.mget(self.generation_key, self.prefix + key)
+        except self.errors:
+            # redis unreachable: build the response, set() won't store it under generation -1
+            return -1, None
+        current = int(generation or 0)
+        if entry is None:
+            return current, None
+        # bytes, the client isn't set to decode responses
+        stored, media_type, tag, body = (entry if isinstance(entry, bytes) else entry.encode()).split(b"\n", 3)
+        if int(stored) != current:
+            return current, None
+        return current, CachedResponse(body, media_type.decode(), tag.decode())
+
+    async def set(self, key: str, value: CachedResponse, generation: int) -> None:
+        # stored with the generation it was built from, stale if a write bumped it meanwhile
+        if generation < 0:
+            return
+        entry = b"\n".join([str(generation).encode(), value.media_type.encode(), value.etag.encode(), value.body])
+        try:
+            await self.client.set(self.prefix + key, entry, px=int(self.ttl * 1000))
+        except self.errors:
+            pass
+
+    async def clear(self) -> None:
+        # the write has been committed, failing its request now would only invite a retry.
+        # If redis can't be reached, its entries expire within the TTL
+        try:
+            await self.client.incr(self.generation_key)
+        except self.errors:
+            pass
+
+
+class NoBackend:
+    '''
+    caches nothing, responses are built on every request and still carry their ETag
+    '''
+
+    async def get(self, key: str) -> Tuple[int, Optional[CachedResponse]]:
+        return 0, None
+
+    async def set(self, key: str, value: CachedResponse, generation: int) -> None:
+        pass
+
+    async def clear(self) -> None:
+        pass
+
+
+def cache_backend() -> CacheBackend:
+    '''
+    redis when CACHE_URL is set. Otherwise memory, for a single server process only: with
+    several, a write through one would leave the others serving stale pages until the TTL
+    '''
+    if CACHE_URL:
+        return RedisBackend(CACHE_URL)
+    if WORKERS > 1:
+        return NoBackend()
+    return MemoryBackend()
+
+
+def etag(body: bytes) -> str:
+    '''
+    strong ETag of a response body
+    '''
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class ResponseCache:
+    '''
+    read-through cache of whole responses, cleared by every write
+    '''
+
+    def __init__(self, backend: CacheBackend) -> None:
+        self.backend = backend
+
+    async def get_or_build(self, key: str, build: Callable[[], Awaitable[Tuple[bytes, str]]]) -> CachedResponse:
+        '''
+        the cached response for `key`, built from the (body, media type) `build` returns on a miss
+        '''
+        generation, cached = await self.backend.get(key)
+        if cached is not None:
+            return cached
+
+        body, media_type = await build()
+        response = CachedResponse(body, media_type, etag(body))
+        # a response built across an invalidation is not served from the cache
+        await self.backend.set(key, response, generation)
+        return response
+
+    async def invalidate(self) -> None:
+        '''
+        forget every cached response, after the data changed
+        '''
+        await self.backend.clear()
+
+
+def conditional_response(request: Request, cached: CachedResponse) -> Response:
+    '''
+    304 without a body when the client already has this version, the full response otherwise.
+    no-cache makes clients revalidate every time, so they never show a stale version
+    '''
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    tags = if_none_match(request)
+    if cached.etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type=cached.media_type, headers=headers)
+
+
+def if_none_match(request: Request) -> Set[str]:
+    '''
+    ETags the client already has, compared weakly as the header requires
+    '''
+    tags = set()
+    for tag in request.headers.get("if-none-match", "").split(","):
+        tag = tag.strip()
+        tags.add(tag[2:] if tag.startswith("W/") else tag)
+    return tags
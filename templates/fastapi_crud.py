@@ -0,0 +1,177 @@
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import ScalarSelect, and_, bindparam, delete, insert, or_, select, text, update
+from sqlalchemy.orm import Session
+
+from fastapi_database_config import SEARCH_TOKENIZER
+from fastapi_models import Cities
+
+# Database work of the app, written once against the Session API. The app runs each
+# call through fastapi_database.run, which keeps it off the event loop for both the
+# sync and the async data layer
+
+
+def list_cities(db: Session, timezone: Optional[str] = None, after: int = 0, limit: Optional[int] = None) -> List[Cities]:
+    '''
+    cities in id order, optionally only those in a timezone. Paging is keyset based:
+    the next page starts after the last id of the previous one, which the primary key
+    (or the timezone index, which ends in the row id) seeks to directly, however deep the page
+    '''
+    query = select(Cities).where(Cities.id > after).order_by(Cities.id)
+    if timezone:
+        query = query.where(Cities.timezone == timezone)
+    if limit is not None:
+        query = query.limit(limit)
+    return list(db.scalars(query))
+
+
+def search_cities(db: Session, query: str, limit: int, offset: int = 0, tokenizer: str = SEARCH_TOKENIZER) -> List[Cities]:
+    '''
+    cities whose name or timezone match `query`, best match first. On SQLite the full-text index
+    answers it, elsewhere (and for trigram searches too short to have a trigram) a LIKE scan does
+    '''
+    match = match_expression(query, tokenizer)
+    if match is None or db.get_bind().dialect.name != "sqlite":
+        return like_cities(db, query, limit, offset)
+    # rank the matches in the index, then read just the page of rows they point to
+    statement = text(
+        "SELECT cities.* FROM cities JOIN ("
+        "SELECT rowid, rank FROM cities_fts WHERE cities_fts MATCH :match ORDER BY rank, rowid LIMIT :limit OFFSET :offset"
+        ") AS hits ON cities.id = hits.rowid ORDER BY hits.rank, hits.rowid"
+    )
+    return list(db.scalars(select(Cities).from_statement(statement), {"match": match, "limit": limit, "offset": offset}))
+
+
+def match_expression(query: str, tokenizer: str) -> Optional[str]:
+    '''
+    FTS5 query for the user's search: every word as a prefix for word tokenizers, the whole
+    text as one phrase for trigram. None when the index can't answer it
+    '''
+    if tokenizer.startswith("trigram"):
+        query = query.strip()
+        return '"' + query.replace('"', '""') + '"' if len(query) >= 3 else None
+    # letters and digits, as unicode61 splits them
+    words = re.findall(r"[^\W_]+", query)
+    return " ".join(f'"{word}"*' for word in words) if words else None
+
+
+def like_cities(db: Session, query: str, limit: int, offset: int = 0) -> List[Cities]:
+    '''
+    cities whose name or timezone contain `query`, in id order. Scans the whole table
+    '''
+    pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    contains = or_(Cities.name.ilike(pattern, escape="\\"), Cities.timezone.ilike(pattern, escape="\\"))
+    return list(db.scalars(select(Cities).where(contains).order_by(Cities.id).limit(limit).offset(offset)))
+
+
+def get_city(db: Session, id: int) -> Optional[Cities]:
+    '''
+    city by id
+    '''
+    return db.get(Cities, id)
+
+
+def find_city(db: Session, name: str, timezone: str) -> Optional[Cities]:
+    '''
+    first city with that name and timezone
+    '''
+    return db.scalars(select(Cities).where(and_(Cities.name == name, Cities.timezone == timezone)).limit(1)).first()
+
+
+def create_city(db: Session, name: str, timezone: str) -> Cities:
+    '''
+    store a new city
+    '''
+    city = Cities(name=name, timezone=timezone)
+    db.add(city)
+    db.commit()
+    return city
+
+
+def delete_city(db: Session, name: str, timezone: str) -> bool:
+    '''
+    delete the first city with that name and timezone, False if there is none
+    '''
+    city = find_city(db, name, timezone)
+    if city is None:
+        return False
+    db.delete(city)
+    db.commit()
+    return True
+
+
+def update_city(db: Session, name: str, timezone: str, newname: str, newtimezone: str) -> bool:
+    '''
+    rename the first city with that name and timezone, False if there is none
+    '''
+    city = find_city(db, name, timezone)
+    if city is None:
+        return False
+    city.name = newname
+    city.timezone = newtimezone
+    db.commit()
+    return True
+
+
+def first_match() -> ScalarSelect[int]:
+    '''
+    id of the first city named :old_name in :old_timezone, for executemany statements
+    '''
+    return select(Cities.id).where(Cities.name == bindparam("old_name"), Cities.timezone == bindparam("old_timezone")) \
+        .order_by(Cities.id).limit(1).scalar_subquery()
+
+
+def create_cities(db: Session, cities: List[Tuple[str, str]]) -> List[int]:
+    '''
+    store many (name, timezone) cities in one transaction, return their ids
+    '''
+    if not cities:
+        return []
+    # the ids must come back in the order of the cities, callers pair them up. Batched
+    # executemany RETURNING (Postgres) doesn't keep that order unless asked to
+    ids: List[int] = list(db.scalars(insert(Cities).returning(Cities.id, sort_by_parameter_order=True),
+                                     [{"name": name, "timezone": timezone} for name, timezone in cities]))
+    db.commit()
+    return ids
+
+
+def delete_cities(db: Session, cities: List[Tuple[str, str]]) -> int:
+    '''
+    delete the first city of each (name, timezone) in one executemany and transaction,
+    return how many were deleted
+    '''
+    if not cities:
+        return 0
+    table = Cities.__table__
+    result = db.execute(delete(table).where(table.c.id == first_match()),
+                        [{"old_name": name, "old_timezone": timezone} for name, timezone in cities])
+    db.commit()
+    return int(result.rowcount)
+
+
+def update_cities(db: Session, cities: List[Tuple[str, str, str, str]]) -> int:
+    '''
+    rename the first city of each (name, timezone, newname, newtimezone) in one executemany
+    and transaction, return how many were updated
+    '''
+    if not cities:
+        return 0
+    table = Cities.__table__
+    result = db.execute(update(table).where(table.c.id == first_match()).values(name=bindparam("newname"), timezone=bindparam("newtimezone")),
+                        [{"old_name": name, "old_timezone": timezone, "newname": newname, "newtimezone": newtimezone}
+                         for name, timezone, newname, newtimezone in cities])
+    db.commit()
+    return int(result.rowcount)
+
+
+def set_times(db: Session, times: List[Tuple[int, str]]) -> None:
+    '''
+    store the current time of many (id, time) cities in one executemany and transaction
+    '''
+    if not times:
+        return
+    table = Cities.__table__
+    db.execute(update(table).where(table.c.id == bindparam("city_id")).values(time=bindparam("city_time")),
+               [{"city_id": id, "city_time": time} for id, time in times])
+    db.commit()
@@ -1,13 +1,61 @@
+from typing import Callable, TypeVar
+
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from fastapi_database_config import DATABASE_URL, DB_POOL_SIZE, engine_options, set_sqlite_pragmas
+
+T = TypeVar("T")
+
+# Connections opened at startup, the whole pool
+WARM_CONNECTIONS = DB_POOL_SIZE
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+set_sqlite_pragmas(engine)
+
+# Time every statement for /metrics, when the app was generated with --metrics
+try:
+    from metrics import instrument_engine
+except ImportError:
+    pass
+else:
+    instrument_engine(engine)
+
+# Objects stay usable after commit, the app reads them once their session is closed
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+Base = declarative_base()
+
+
+async def create_tables() -> None:
+    '''
+    create the table of every model that doesn't exist yet
+    '''
+    await run_in_threadpool(Base.metadata.create_all, bind=engine)
+
+
+def _open_pool() -> None:
+    connections = [engine.connect() for _ in range(WARM_CONNECTIONS)]
+    for connection in connections:
+        connection.close()
+
+
+async def warm_up() -> None:
+    '''
+    fill the connection pool, so the first requests don't pay for connecting
+    '''
+    await run_in_threadpool(_open_pool)
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./cities.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def _in_session(work: Callable[[Session], T]) -> T:
+    with SessionLocal() as db:
+        return work(db)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+async def run(work: Callable[[Session], T]) -> T:
+    '''
+    run a unit of database work in its own session on a worker thread,
+    so blocking sqlite calls never stall the event loop
+    '''
+    return await run_in_threadpool(_in_session, work)
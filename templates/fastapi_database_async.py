@@ -0,0 +1,54 @@
+from typing import Callable, TypeVar
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from fastapi_database_config import DATABASE_URL, DB_POOL_SIZE, engine_options, set_sqlite_pragmas
+
+T = TypeVar("T")
+
+# Connections opened at startup, the whole pool
+WARM_CONNECTIONS = DB_POOL_SIZE
+
+# aiosqlite (or asyncpg) talks to the database without blocking the event loop
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+set_sqlite_pragmas(engine.sync_engine)
+
+# Time every statement for /metrics, when the app was generated with --metrics
+try:
+    from metrics import instrument_engine
+except ImportError:
+    pass
+else:
+    instrument_engine(engine)
+
+# Objects stay usable after commit, the app reads them once their session is closed
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
+
+
+async def create_tables() -> None:
+    '''
+    create the table of every model that doesn't exist yet
+    '''
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def warm_up() -> None:
+    '''
+    fill the connection pool, so the first requests don't pay for connecting
+    '''
+    connections = [await engine.connect() for _ in range(WARM_CONNECTIONS)]
+    for connection in connections:
+        await connection.close()
+
+
+async def run(work: Callable[[Session], T]) -> T:
+    '''
+    run a unit of database work in its own session on the async driver, the
+    event loop keeps serving other requests while it waits on the database
+    '''
+    async with SessionLocal() as db:
+        return await db.run_sync(work)
@@ -0,0 +1,127 @@
+'''
+Concurrent readers and writers on SQLite, with its default settings and with the app's pragmas:
+
+    python fastapi_database_benchmark.py --writers 4 --readers 4 --seconds 5
+
+Writers create a city per transaction and readers fetch pages of cities, through the same crud
+functions as POST /cities and GET /cities. Each profile runs on a fresh database file seeded with
+--cities rows. The tuned settings are overridden the same way as the app's, e.g. SQLITE_SYNCHRONOUS=FULL.
+'''
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from fastapi_crud import create_city, list_cities
+from fastapi_database_config import SQLITE_PRAGMAS, engine_options, set_sqlite_pragmas
+from fastapi_models import Cities
+
+PAGE_SIZE = 50
+
+PROFILES: Dict[str, Dict[str, str]] = {
+    # rollback journal, a sync to disk on every commit, 2MB of cache
+    "sqlite defaults": {},
+    "app pragmas": SQLITE_PRAGMAS,
+}
+
+
+def seeded_engine(path: str, pragmas: Dict[str, str], count: int) -> Engine:
+    '''
+    engine on a new database at `path` holding `count` cities
+    '''
+    url = f"sqlite:///{path}"
+    engine = create_engine(url, **engine_options(url))
+    set_sqlite_pragmas(engine, pragmas)
+    Cities.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Cities), [{"name": f"seed-{i}", "timezone": "Etc/UTC"} for i in range(count)])
+    return engine
+
+
+def write(engine: Engine, worker: int, stop: threading.Event, latencies: List[float], errors: List[str]) -> None:
+    '''
+    create one city per transaction until stopped
+    '''
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with Session(engine) as db:
+                create_city(db, f"writer-{worker}-{i}", "Etc/UTC")
+        except Exception as error:
+            errors.append(type(error).__name__)
+        else:
+            latencies.append(time.perf_counter() - start)
+        i += 1
+
+
+def read(engine: Engine, count: int, stop: threading.Event, latencies: List[float], errors: List[str]) -> None:
+    '''
+    fetch a random page of cities until stopped
+    '''
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with Session(engine) as db:
+                list_cities(db, after=random.randrange(count), limit=PAGE_SIZE)
+        except Exception as error:
+            errors.append(type(error).__name__)
+        else:
+            latencies.append(time.perf_counter() - start)
+
+
+def p99(latencies: List[float]) -> float:
+    '''
+    99th percentile in milliseconds
+    '''
+    if len(latencies) < 2:
+        return float("nan")
+    return statistics.quantiles(latencies, n=100)[98] * 1000
+
+
+def run(pragmas: Dict[str, str], writers: int, readers: int, seconds: float, count: int) -> List[str]:
+    '''
+    one profile, as cells of the results table
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        engine = seeded_engine(os.path.join(directory, "cities.db"), pragmas, count)
+        stop = threading.Event()
+        writes: List[float] = []
+        reads: List[float] = []
+        errors: List[str] = []
+        threads = [threading.Thread(target=write, args=(engine, i, stop, writes, errors)) for i in range(writers)]
+        threads += [threading.Thread(target=read, args=(engine, count, stop, reads, errors)) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+    return [f"{len(writes) / seconds:.0f}", f"{p99(writes):.1f}", f"{len(reads) / seconds:.0f}", f"{p99(reads):.1f}", str(len(errors))]
+
+
+def main(writers: int, readers: int, seconds: float, count: int) -> None:
+    headers = ["writes/s", "write p99 ms", "reads/s", "read p99 ms", "errors"]
+    print(f"{'profile':<18}" + "".join(f"{x:>14}" for x in headers))
+    for name, pragmas in PROFILES.items():
+        cells = run(pragmas, writers, readers, seconds, count)
+        print(f"{name:<18}" + "".join(f"{x:>14}" for x in cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare SQLite settings under concurrent reads and writes")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--cities", type=int, default=10000)
+    args = parser.parse_args()
+    main(args.writers, args.readers, args.seconds, args.cities)
@@ -0,0 +1,79 @@
+'''
+Database settings of the cities app. The defaults come from how the app was generated
+(pyrepo fastapi --database sqlite|postgres), every one can be overridden from the environment:
+
+    DATABASE_URL=postgresql+psycopg2://user:password@db:5432/cities DB_POOL_SIZE=20 python fastapi_app.py
+'''
+import os
+from typing import TYPE_CHECKING, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine.interfaces import DBAPIConnection
+
+DATABASE_URL = os.getenv("DATABASE_URL", "{{ database_url }}")
+
+# Connection pool: connections kept open, extra ones opened under load (closed again once
+# returned) and the seconds a request waits for a free one before failing
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+# Database servers only: check each connection before handing it out, replacing the ones the
+# server or a proxy has dropped, and retire connections older than DB_POOL_RECYCLE seconds
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+# SQLite pragmas, run on every new connection. WAL lets readers carry on while a writer commits,
+# NORMAL syncs to disk at checkpoints instead of every commit (an app crash loses nothing, a power
+# cut may lose the last commits), mmap reads pages without copying them, a negative cache is in KiB
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", str(-64 * 1024)),
+    # milliseconds a connection waits for another one's write lock before failing
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),
+}
+
+# Tokenizer of the SQLite full-text index behind GET /cities/search: unicode61 matches words and
+# word prefixes, trigram any part of a name 3 characters or longer (and makes a bigger index).
+# Read when the index is created, drop it (fastapi_models.drop_search_index) to switch
+SEARCH_TOKENIZER = os.getenv("SEARCH_TOKENIZER", "{{ search_tokenizer }}")
+
+
+def engine_options(url: str) -> Dict[str, object]:
+    '''
+    keyword arguments of create_engine (or create_async_engine) for the database at `url`
+    '''
+    parsed = make_url(url)
+    options: Dict[str, object] = {}
+    if parsed.get_backend_name() == "sqlite":
+        # the sync driver's connections are shared with the threadpool serving requests
+        if parsed.get_driver_name() == "pysqlite":
+            options["connect_args"] = {"check_same_thread": False}
+        # in-memory databases live in a single connection, there is no pool to size
+        if parsed.database in (None, "", ":memory:"):
+            return options
+    else:
+        options.update(pool_pre_ping=DB_POOL_PRE_PING, pool_recycle=DB_POOL_RECYCLE)
+    options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+def set_sqlite_pragmas(engine: Engine, pragmas: Dict[str, str] = SQLITE_PRAGMAS) -> None:
+    '''
+    run `pragmas` on every connection the engine opens, nothing for other databases.
+    Pass the sync_engine of an async engine
+    '''
+    if engine.dialect.name != "sqlite":
+        return
+
+    def connect(dbapi_connection: "DBAPIConnection", connection_record: object) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    event.listen(engine, "connect", connect)
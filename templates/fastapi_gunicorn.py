@@ -0,0 +1,40 @@
+'''
+Production server for the cities app: gunicorn managing uvicorn workers. From the repository root
+
+    gunicorn -c fastapi/fastapi_gunicorn.py
+
+Every setting can be overridden from the environment, e.g. WEB_CONCURRENCY=4 or BIND=0.0.0.0:80.
+'''
+import multiprocessing
+import os
+
+# Serve the app next to this file, wherever gunicorn is started from
+chdir = os.path.dirname(os.path.abspath(__file__))
+wsgi_app = "fastapi_app:app"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Each worker is a process with its own event loop serving many connections,
+# one per CPU keeps every core busy without processes fighting over them
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Tell the app how many processes serve it: its response cache lives in memory only when it is
+# the single one, several share the cache at CACHE_URL (or don't cache)
+raw_env = [f"WEB_CONCURRENCY={workers}"]
+
+# Connections waiting to be accepted when every worker is busy
+backlog = int(os.getenv("BACKLOG", 2048))
+# Keep idle connections open longer than the load balancer in front does (60s for most),
+# so it never reuses a connection the app has just closed
+keepalive = int(os.getenv("KEEPALIVE", 75))
+
+# Restart each worker after about this many requests, the jitter staggers the restarts
+# so workers don't recycle at once. Guards against slow memory growth
+max_requests = int(os.getenv("MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 1000))
+# Workers silent for this long are killed and replaced
+timeout = int(os.getenv("TIMEOUT", 60))
+# Time a stopping worker gets to finish its requests and drain its job queue
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 40))
+
+accesslog = os.getenv("ACCESS_LOG", "-")
+errorlog = "-"
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Worker tasks draining the queue. SQLite takes one writer at a time, a couple is enough
+JOB_WORKERS = 2
+# Most jobs waiting at once, submitters wait for room beyond that
+JOB_QUEUE_SIZE = 10000
+# Most queued jobs a worker coalesces into one call of the handler
+JOB_BATCH_SIZE = 500
+# Attempts after the first one for a failing batch, waiting JOB_RETRY_SECONDS, doubled each time
+JOB_RETRIES = 3
+JOB_RETRY_SECONDS = 0.5
+# How long shutdown waits for the queue to empty
+JOB_DRAIN_SECONDS = 30
+
+log = logging.getLogger("uvicorn.error")
+
+
+class JobQueue(Generic[T]):
+    '''
+    bounded in-process queue worked by a pool of tasks. Each worker takes every job
+    waiting (up to JOB_BATCH_SIZE) and hands them to `handler` in a single call
+    '''
+
+    def __init__(self, handler: Callable[[List[T]], Awaitable[None]], workers: int = JOB_WORKERS,
+                 maxsize: int = JOB_QUEUE_SIZE, batch_size: int = JOB_BATCH_SIZE, retries: int = JOB_RETRIES) -> None:
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.retries = retries
+        # created by start, on the loop that serves the app
+        self.queue: Optional["asyncio.Queue[T]"] = None
+        self.tasks: List["asyncio.Task[None]"] = []
+        self.counters = {"processed": 0, "failed": 0, "batches": 0, "retries": 0, "in_flight": 0}
+
+    def start(self) -> None:
+        '''
+        create the queue and its workers
+        '''
+        self.queue = asyncio.Queue(self.maxsize)
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+    async def submit(self, jobs: List[T]) -> None:
+        '''
+        queue jobs, waiting while the queue is full
+        '''
+        if self.queue is None:
+            raise RuntimeError("job queue is not started")
+        for job in jobs:
+            await self.queue.put(job)
+
+    async def work(self) -> None:
+        '''
+        worker loop, handle whatever is waiting as one batch
+        '''
+        assert self.queue is not None
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self.counters["in_flight"] += len(batch)
+            try:
+                await self.handle(batch)
+            finally:
+                self.counters["in_flight"] -= len(batch)
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def handle(self, batch: List[T]) -> None:
+        '''
+        run the handler on a batch, retrying with backoff before giving up on it
+        '''
+        for attempt in range(self.retries + 1):
+            try:
+                await self.handler(batch)
+            except Exception:
+                if attempt == self.retries:
+                    self.counters["failed"] += len(batch)
+                    log.exception("job batch of %d failed, dropping it", len(batch))
+                    return
+                self.counters["retries"] += 1
+                await asyncio.sleep(JOB_RETRY_SECONDS * 2 ** attempt)
+            else:
+                self.counters["processed"] += len(batch)
+                self.counters["batches"] += 1
+                return
+
+    def stats(self) -> Dict[str, int]:
+        '''
+        queue depth and job counters
+        '''
+        return {
+            "depth": self.queue.qsize() if self.queue is not None else 0,
+            "capacity": self.maxsize,
+            "workers": self.workers,
+            **self.counters,
+        }
+
+    async def drain(self, timeout: float = JOB_DRAIN_SECONDS) -> None:
+        '''
+        wait for queued jobs to finish, then stop the workers
+        '''
+        if self.queue is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                log.warning("job queue not drained after %ss, dropping %d jobs", timeout, self.queue.qsize())
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
@@ -0,0 +1,76 @@
+'''
+Load test for the cities API, run against a running app:
+
+    python fastapi_loadtest.py --url http://127.0.0.1:8000 --requests 2000 --concurrency 50
+
+Generate the app with and without `--async-db` and run this against each to compare
+the throughput of the sync and async data layers under concurrency.
+'''
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+# name, method, path; POST bodies are generated per request
+SCENARIOS: List[Tuple[str, str, str]] = [
+    ("create", "POST", "/cities"),
+    ("filter", "GET", "/?timezone=Europe/London"),
+    ("page", "GET", "/cities?limit=100"),
+]
+
+
+async def run_scenario(client: httpx.AsyncClient, method: str, path: str, total: int, concurrency: int) -> Dict[str, float]:
+    '''
+    send `total` requests with at most `concurrency` in flight, return throughput and latency
+    '''
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            # One city in a hundred is in the timezone the filter scenario reads back
+            timezone = "Europe/London" if i % 100 == 0 else "Etc/UTC"
+            body: Optional[Dict[str, str]] = {"name": f"loadtest-{i}", "timezone": timezone} if method == "POST" else None
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+async def main(url: str, total: int, concurrency: int) -> None:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        print(f"{'scenario':<10}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        for name, method, path in SCENARIOS:
+            result = await run_scenario(client, method, path, total, concurrency)
+            print(f"{name:<10}{total:>10}{result['rps']:>10.0f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['errors']:>8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the cities API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.requests, args.concurrency))
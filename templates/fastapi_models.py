@@ -1,11 +1,60 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, MetaData, String, event
+from sqlalchemy.engine import Connection
 
 from fastapi_database import Base
+from fastapi_database_config import SEARCH_TOKENIZER
 
 class Cities(Base):
     __tablename__ = "cities"
+    # Lookups by name and timezone (delete, update and their bulk versions) seek this index,
+    # which also serves lookups by name alone
+    __table_args__ = (Index("ix_cities_name_timezone", "name", "timezone"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, unique=False, index=True)
+    name = Column(String, unique=False)
     timezone = Column(String, unique=False, index=True)
-    time = Column(String, unique=False, index=True)
\ No newline at end of file
+    time = Column(String, unique=False)
+
+
+# Full-text index of city names and timezones, SQLite only. It is an external content FTS5
+# table: it holds just the index and reads the rows from cities, and the triggers keep it in
+# step with every write, bulk ones included. Storing a city's time doesn't touch it
+SEARCH_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE cities_fts USING fts5(name, timezone, content='cities', content_rowid='id', tokenize='{tokenizer}')",
+    # a match in the name ranks well above a match in the timezone
+    "INSERT INTO cities_fts(cities_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    "CREATE TRIGGER cities_fts_insert AFTER INSERT ON cities BEGIN "
+    "INSERT INTO cities_fts(rowid, name, timezone) VALUES (new.id, new.name, new.timezone); END",
+    "CREATE TRIGGER cities_fts_delete AFTER DELETE ON cities BEGIN "
+    "INSERT INTO cities_fts(cities_fts, rowid, name, timezone) VALUES ('delete', old.id, old.name, old.timezone); END",
+    "CREATE TRIGGER cities_fts_update AFTER UPDATE OF name, timezone ON cities BEGIN "
+    "INSERT INTO cities_fts(cities_fts, rowid, name, timezone) VALUES ('delete', old.id, old.name, old.timezone); "
+    "INSERT INTO cities_fts(rowid, name, timezone) VALUES (new.id, new.name, new.timezone); END",
+    # index the cities stored before the index existed
+    "INSERT INTO cities_fts(cities_fts) VALUES ('rebuild')",
+]
+
+
+def create_search_index(connection: Connection, tokenizer: str = SEARCH_TOKENIZER) -> None:
+    '''
+    create the full-text index of cities and its triggers, unless it exists
+    '''
+    if connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'cities_fts'").first():
+        return
+    for statement in SEARCH_INDEX_DDL:
+        connection.exec_driver_sql(statement.format(tokenizer=tokenizer))
+
+
+def drop_search_index(connection: Connection) -> None:
+    '''
+    drop the full-text index of cities and its triggers, the next startup builds it again
+    '''
+    for trigger in ["cities_fts_insert", "cities_fts_delete", "cities_fts_update"]:
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    connection.exec_driver_sql("DROP TABLE IF EXISTS cities_fts")
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_search_index(metadata: MetaData, connection: Connection, **kw: object) -> None:
+    if connection.dialect.name == "sqlite":
+        create_search_index(connection)
@@ -0,0 +1,126 @@
+'''
+Full-text search against LIKE scans on a large SQLite table:
+
+    python fastapi_search_benchmark.py --cities 1000000 --queries 100
+
+Seeds a fresh database with --cities made-up cities, then times the first page of
+GET /cities/search through the crud functions of the app: the LIKE scan other databases get,
+and the full-text index with each tokenizer. The queries are whole city names (a few dozen
+matches), the first 4 letters of a name (thousands), 5 letters from the middle of a name,
+which word tokenizers can't find, and text no city contains.
+'''
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from fastapi_crud import like_cities, search_cities
+from fastapi_database_config import engine_options, set_sqlite_pragmas
+from fastapi_models import Cities, create_search_index, drop_search_index
+
+PAGE_SIZE = 20
+SYLLABLES = ["bar", "ton", "vil", "mar", "ken", "lor", "sa", "dun", "ber", "gal", "ros", "tia", "nor",
+             "wick", "ham", "ford", "ley", "por", "can", "del", "mon", "ri", "ash", "bel", "cor", "ston"]
+TIMEZONES = ["Europe/London", "Europe/Paris", "America/New_York", "America/Chicago", "Asia/Tokyo",
+             "Asia/Kolkata", "Africa/Cairo", "Australia/Sydney", "America/Sao_Paulo", "Etc/UTC"]
+
+Search = Callable[[Session, str], List[Cities]]
+
+
+def city_name(rng: random.Random) -> str:
+    '''
+    made-up city name of two to four syllables, sometimes two words
+    '''
+    name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+    if rng.random() < 0.3:
+        name += " " + "".join(rng.choice(SYLLABLES) for _ in range(2)).capitalize()
+    return name
+
+
+def seeded_engine(path: str, count: int) -> Engine:
+    '''
+    engine on a new database at `path` holding `count` cities, without a search index
+    '''
+    url = f"sqlite:///{path}"
+    engine = create_engine(url, **engine_options(url))
+    set_sqlite_pragmas(engine)
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        Cities.metadata.create_all(conn)
+        drop_search_index(conn)
+        for start in range(0, count, 100000):
+            conn.execute(insert(Cities), [{"name": city_name(rng), "timezone": rng.choice(TIMEZONES)}
+                                          for _ in range(start, min(count, start + 100000))])
+    return engine
+
+
+def queries(count: int) -> Dict[str, List[str]]:
+    '''
+    each kind of query, taken from names like the seeded ones
+    '''
+    rng = random.Random(1)
+    names = [city_name(rng).split()[0] for _ in range(count)]
+    return {
+        "name": names,
+        "prefix": [name[:4] for name in names],
+        "substring": [name[2:7] for name in names],
+        "no match": [f"qux{i}" for i in range(count)],
+    }
+
+
+def timed(engine: Engine, search: Search, texts: List[str]) -> str:
+    '''
+    mean and p95 milliseconds of the first page of each search
+    '''
+    seconds = []
+    with Session(engine) as db:
+        for query in texts:
+            start = time.perf_counter()
+            search(db, query)
+            seconds.append(time.perf_counter() - start)
+    p95 = statistics.quantiles(seconds, n=20)[18] if len(seconds) > 1 else seconds[0]
+    return f"{statistics.mean(seconds) * 1000:.2f} / {p95 * 1000:.2f}"
+
+
+def main(count: int, query_count: int) -> None:
+    texts = queries(query_count)
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        engine = seeded_engine(os.path.join(directory, "cities.db"), count)
+        print(f"seeded {count} cities in {time.perf_counter() - start:.1f}s")
+
+        results: Dict[str, Dict[str, str]] = {}
+        results["LIKE scan"] = {kind: timed(engine, lambda db, q: like_cities(db, q, PAGE_SIZE), texts[kind]) for kind in texts}
+        for tokenizer in ["unicode61", "trigram"]:
+            with engine.begin() as conn:
+                drop_search_index(conn)
+                start = time.perf_counter()
+                create_search_index(conn, tokenizer)
+            print(f"built the {tokenizer} index in {time.perf_counter() - start:.1f}s")
+
+            def search(db: Session, query: str) -> List[Cities]:
+                return search_cities(db, query, PAGE_SIZE, tokenizer=tokenizer)
+
+            # word prefixes can't find a piece from the middle of a word
+            kinds = [kind for kind in texts if tokenizer == "trigram" or kind != "substring"]
+            results[f"FTS5 {tokenizer}"] = {kind: timed(engine, search, texts[kind]) for kind in kinds}
+        engine.dispose()
+
+    print(f"\n{'ms per query, mean / p95':<26}" + "".join(f"{kind:>18}" for kind in texts))
+    for name, row in results.items():
+        print(f"{name:<26}" + "".join(f"{row.get(kind, '-'):>18}" for kind in texts))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full-text search with LIKE scans of the cities table")
+    parser.add_argument("--cities", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+    main(args.cities, args.queries)
@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from typing import Dict, Optional, Protocol, Tuple
+
+import httpx
+
+if sys.version_info >= (3, 9):
+    from zoneinfo import ZoneInfo
+else:
+    from backports.zoneinfo import ZoneInfo
+
+# Base url of a worldtimeapi compatible service, e.g. http://worldtimeapi.org/api/timezone.
+# Unset, current times come from the local tz database and the app needs no network
+TIME_API_URL = os.getenv('TIME_API_URL')
+# How long the remote provider reuses the UTC offset it got for a timezone
+TIME_API_CACHE_SECONDS = 600
+# Timezones whose zone is kept loaded. The tz database has about 600, the rest of the room
+# holds names clients sent that don't exist, the least recently used are dropped
+ZONE_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=ZONE_CACHE_SIZE)
+def zone(timezone: str) -> Optional[ZoneInfo]:
+    '''
+    tz database zone of that timezone, None if it doesn't exist. Cached, each timezone is loaded once
+    '''
+    try:
+        return ZoneInfo(timezone)
+    except (ValueError, LookupError):
+        return None
+
+
+class TimeProvider(Protocol):
+    '''
+    where the app gets the current time of a city from
+    '''
+
+    async def current_time(self, timezone: str) -> Optional[str]:
+        ...
+
+    async def aclose(self) -> None:
+        ...
+
+
+class LocalTimeProvider:
+    '''
+    current times from the local tz database
+    '''
+
+    async def current_time(self, timezone: str) -> Optional[str]:
+        '''
+        ISO 8601 time in that timezone, None if the timezone doesn't exist
+        '''
+        tz = zone(timezone)
+        if tz is None:
+            return None
+        return datetime.now(tz).isoformat()
+
+    async def aclose(self) -> None:
+        pass
+
+
+class RemoteTimeProvider:
+    '''
+    current times from a worldtimeapi compatible service, over one pooled connection.
+    The UTC offset of each timezone is reused for TIME_API_CACHE_SECONDS, so cities sharing
+    a timezone cost one request
+    '''
+
+    def __init__(self, url: str, client: Optional[httpx.AsyncClient] = None) -> None:
+        self.url = url.rstrip('/')
+        self.client = client or httpx.AsyncClient(timeout=10, limits=httpx.Limits(max_keepalive_connections=10))
+        # timezone -> (monotonic expiry, utc offset)
+        self.offsets: Dict[str, Tuple[float, timedelta]] = {}
+
+    async def utc_offset(self, timezone: str) -> Optional[timedelta]:
+        '''
+        UTC offset of that timezone, None if the service doesn't know it or can't be reached
+        '''
+        cached = self.offsets.get(timezone)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        try:
+            r = await self.client.get(f'{self.url}/{timezone}')
+            r.raise_for_status()
+            offset = datetime.fromisoformat(r.json()['datetime']).utcoffset()
+        except (httpx.HTTPError, KeyError, ValueError):
+            return None
+        if offset is None:
+            return None
+
+        self.offsets[timezone] = (time.monotonic() + TIME_API_CACHE_SECONDS, offset)
+        return offset
+
+    async def current_time(self, timezone: str) -> Optional[str]:
+        '''
+        ISO 8601 time in that timezone, None if it couldn't be resolved
+        '''
+        offset = await self.utc_offset(timezone)
+        if offset is None:
+            return None
+        return datetime.now(dt_timezone(offset)).isoformat()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def time_provider() -> TimeProvider:
+    '''
+    the remote provider when TIME_API_URL is set, the local one otherwise
+    '''
+    if TIME_API_URL:
+        return RemoteTimeProvider(TIME_API_URL)
+    return LocalTimeProvider()
@@ -0,0 +1,38 @@
+'''
+Offline stand-in for worldtimeapi, to test the remote time provider without network:
+
+    uvicorn fastapi_time_stub:app --port 8001
+    TIME_API_URL=http://127.0.0.1:8001/api/timezone python fastapi_app.py
+
+GET /stats returns how many lookups it served, to check the app's per-timezone cache.
+'''
+from datetime import datetime
+from typing import Dict
+
+from fastapi import FastAPI, HTTPException
+
+from fastapi_time import zone
+
+app = FastAPI()
+
+lookups: Dict[str, int] = {}
+
+
+@app.get('/api/timezone/{timezone:path}')
+async def timezone_time(timezone: str) -> Dict[str, str]:
+    '''
+    current time in that timezone, shaped like worldtimeapi's answer
+    '''
+    tz = zone(timezone)
+    if tz is None:
+        raise HTTPException(status_code=404, detail="unknown location")
+    lookups[timezone] = lookups.get(timezone, 0) + 1
+    return {"timezone": timezone, "datetime": datetime.now(tz).isoformat()}
+
+
+@app.get('/stats')
+async def stats() -> Dict[str, int]:
+    '''
+    lookups served per timezone
+    '''
+    return lookups
@@ -5,6 +5,14 @@ from flask_restful import Resource, Api
 app = Flask(__name__)
 api = Api(app)
 
+# Request latency metrics at /metrics, when the app was generated with --metrics
+try:
+    from metrics import instrument_flask
+except ImportError:
+    pass
+else:
+    instrument_flask(app)
+
 class HelloWorld(Resource):
     def get(self) -> Dict:
         return {'hello': 'world'}
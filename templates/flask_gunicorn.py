@@ -0,0 +1,84 @@
+'''
+Production server for the Flask app: gunicorn in place of the single threaded development
+server of app.run(). From the repository root
+
+    gunicorn -c flask/flask_gunicorn.py
+
+Every setting can be overridden from the environment, e.g. WEB_CONCURRENCY=4, THREADS=8,
+WORKER_CLASS=gevent or BIND=0.0.0.0:80.
+'''
+import multiprocessing
+import os
+
+from gunicorn.arbiter import Arbiter
+from gunicorn.workers.base import Worker
+
+# Serve the app next to this file, wherever gunicorn is started from: the Postgres app
+# when it was generated, the basic one otherwise
+chdir = os.path.dirname(os.path.abspath(__file__))
+default_app = "flask_postgres:app" if os.path.isfile(os.path.join(chdir, "flask_postgres.py")) else "flask_app:app"
+wsgi_app = os.getenv("WSGI_APP", default_app)
+
+# gthread: each worker process serves requests on a pool of threads, what a Flask app
+# waiting on its database or other services mostly needs.
+# gevent: each worker serves many requests on greenlets, for apps holding many slow
+# connections open (calls to slow services, long polling). Needs the gevent package
+worker_class = os.getenv("WORKER_CLASS", "{{ worker_class }}")
+if worker_class == "gevent":
+    # Patch the standard library before the app is imported below (preload_app), so its
+    # sockets and locks yield to other greenlets instead of blocking the worker
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        # psycopg2 talks to Postgres in C, it yields to other greenlets only with this hook
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        pass
+    else:
+        patch_psycopg()
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Two processes per CPU plus one keeps every core busy while some workers wait on I/O
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Request threads per gthread worker. The Postgres app sizes its connection pool from the same
+# THREADS and WEB_CONCURRENCY variables, keep them set for both
+threads = int(os.getenv("THREADS", 4))
+# Concurrent requests per gevent worker
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", 1000))
+
+# Import the app once in the master process, then fork the workers: they start at once and
+# share the app's memory copy-on-write, instead of each importing it again
+preload_app = True
+
+# Connections waiting to be accepted when every worker is busy
+backlog = int(os.getenv("BACKLOG", 2048))
+# Keep idle connections open longer than the load balancer in front does (60s for most),
+# so it never reuses a connection the app has just closed
+keepalive = int(os.getenv("KEEPALIVE", 75))
+
+# Restart each worker after about this many requests, the jitter staggers the restarts
+# so workers don't recycle at once. Guards against slow memory growth, and with preload_app
+# a new worker is a fork of the loaded app, not another import
+max_requests = int(os.getenv("MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 1000))
+# Workers silent for this long are killed and replaced
+timeout = int(os.getenv("TIMEOUT", 60))
+# Time a stopping worker gets to finish its requests
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 40))
+
+accesslog = os.getenv("ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def post_fork(server: Arbiter, worker: Worker) -> None:
+    '''
+    drop the database connections a worker inherited from the master, it opens its own
+    '''
+    app = server.app.wsgi()
+    database = app.extensions.get("sqlalchemy")
+    if database is None:
+        return
+    with app.app_context():
+        for engine in database.engines.values():
+            # close=False leaves the sockets to the master, closing them here would end its sessions
+            engine.dispose(close=False)
@@ -1,25 +1,89 @@
-from flask import Flask, jsonify, Response
+from flask import Flask, jsonify, request, Response, stream_with_context
 import requests
+import click
 import json
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import Row, Select, select
+from sqlalchemy.pool import NullPool
+from typing import Dict, Iterator, Optional, Tuple
+import multiprocessing
 import os
 import pdb
+import sys
+
+from flask_postgres_ingest import load_items, read_items
 
 
 app = Flask(__name__)
 
+# Largest page of /items_database, and rows fetched from the server-side cursor at a time when streaming
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+
+# Server processes and request threads per process, the defaults of flask_gunicorn.py.
+# Each process has its own connection pool
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+THREADS = int(os.getenv('THREADS', 4))
+# Connections the Postgres server accepts (its max_connections), less some kept free for
+# superusers, migrations and psql sessions. The processes share the rest
+DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', 100))
+DB_RESERVED_CONNECTIONS = int(os.getenv('DB_RESERVED_CONNECTIONS', 10))
+# Seconds before a connection is replaced, under the idle timeout of firewalls and proxies on the way
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+# pgbouncer when the app connects through PgBouncer, which then owns the server connections
+DB_POOLER = os.getenv('DB_POOLER', '{{ db_pooler }}')
+
+
+# Pool settings of each server process
+def engine_options(workers: int, threads: int, pooler: str) -> Dict[str, object]:
+    if pooler == 'pgbouncer':
+        # PgBouncer pools the server connections, the app connects to it (a local round trip)
+        # for each request instead of keeping idle connections to it
+        return {'poolclass': NullPool}
+    # a connection per request thread, and overflow up to this process's share of the server
+    budget = DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS
+    if workers > budget:
+        app.logger.warning('%d processes share %d Postgres connections, connect through PgBouncer', workers, budget)
+    share = max(1, budget // workers)
+    pool_size = min(threads, share)
+    return {
+        'pool_size': pool_size,
+        'max_overflow': share - pool_size,
+        'pool_timeout': 30,
+        'pool_recycle': DB_POOL_RECYCLE,
+        # test connections before use, replacing the ones a server restart or failover dropped
+        'pool_pre_ping': True,
+    }
+
+
 # Grabbing environment variables to represent the
-# Database User, Password and Name
+# Database User, Password, Name and where it listens (PgBouncer listens on 6432)
 pg_user = os.getenv('POSTGRES_DB_USER')
 pg_password = os.getenv('POSTGRES_DB_PASSWORD')
 db_name = os.getenv('POSTGRES_DB_NAME')
-app.config['SQLALCHEMY_DATABASE_URI'] = "postgresql://{}:{}@localhost:5432/{}".format(pg_user, pg_password, db_name)
+pg_host = os.getenv('POSTGRES_DB_HOST', 'localhost')
+pg_port = os.getenv('POSTGRES_DB_PORT', '6432' if DB_POOLER == 'pgbouncer' else '5432')
+app.config['SQLALCHEMY_DATABASE_URI'] = "postgresql://{}:{}@{}:{}/{}".format(pg_user, pg_password, pg_host, pg_port, db_name)
+# DATABASE_URL replaces the whole URI, e.g. sqlite:///items.db for test runs
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', app.config['SQLALCHEMY_DATABASE_URI'])
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(WEB_CONCURRENCY, THREADS, DB_POOLER)
 
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
+# Request and query latency metrics at /metrics, when the app was generated with --metrics
+try:
+    from metrics import instrument_engine, instrument_flask
+except ImportError:
+    pass
+else:
+    instrument_flask(app)
+    with app.app_context():
+        instrument_engine(db.engine)
+
 # Testing route. Should return a simple 'Hello world' string
 @app.route('/test', methods=['GET'])
 def hello_world() -> str:
@@ -40,15 +104,85 @@ def add_item() -> str:
     db.session.commit()
     return response
 
-# Request this route to see a list of all rows in our postgres database
+# Send NDJSON (one {"name": ..., "information": ...} object per line) or CSV with a
+# name,information header to load many items at once, streamed into the table with COPY.
+# Responds with the number of rows loaded and the rows per second
+@app.route('/items/bulk', methods=['POST'])
+def add_items() -> Tuple[Response, int]:
+    format = request.args.get('format', 'csv' if request.mimetype == 'text/csv' else 'ndjson')
+    # decoded a line at a time, the request stream of gunicorn (unlike the development server's)
+    # can't be wrapped in a text stream. A line never splits a character, UTF-8 only uses \n for newlines
+    lines = (line.decode('utf-8') for line in request.stream)
+    try:
+        report = load_items(db.session.connection(), Item.__tablename__, read_items(lines, format))
+    except ValueError as error:
+        db.session.rollback()
+        return jsonify({"error": str(error)}), 400
+    db.session.commit()
+    return jsonify(report), 201
+
+
+# Load items from an NDJSON or CSV file (- for stdin): flask --app flask_postgres load-items items.ndjson
+@app.cli.command('load-items')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', type=click.Choice(['ndjson', 'csv']), default=None, help='Defaults to csv for .csv files, ndjson otherwise')
+def load_items_command(path: str, format: Optional[str]) -> None:
+    format = format or ('csv' if path.endswith('.csv') else 'ndjson')
+    with (open(path, encoding='utf-8', newline='') if path != '-' else sys.stdin) as stream:
+        try:
+            report = load_items(db.session.connection(), Item.__tablename__, read_items(stream, format))
+        except ValueError as error:
+            db.session.rollback()
+            raise click.ClickException(str(error))
+    db.session.commit()
+    click.echo(f"loaded {report['rows']:.0f} items in {report['seconds']}s, {report['rows_per_second']:.0f} rows/s")
+
+
+# Request this route to see the rows in our postgres database, in sourceid order.
+# With ?limit=100 (1 to MAX_PAGE_SIZE) it returns one page, {"items": [...], "next": <sourceid>}:
+# pass next back as ?after= for the following page. Without a limit it streams every row as one JSON list
 @app.route('/items_database', methods=['GET'])
 def show_items_from_database() -> Response:
-    items = Item.query.all()
-    results = [{
-                "name": item.name,
-                "information": item.information
-            } for item in items]
-    return jsonify(results)
+    # a value that isn't a number reads as missing, which for limit means streaming the whole table
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', type=int)
+    if ('after' in request.args and after is None) or ('limit' in request.args and limit is None) \
+            or (limit is not None and not 1 <= limit <= MAX_PAGE_SIZE):
+        response = jsonify({"error": f"after must be an integer and limit an integer from 1 to {MAX_PAGE_SIZE}"})
+        response.status_code = 400
+        return response
+    after = after or 0
+    if limit is None:
+        return Response(stream_with_context(stream_items(after)), mimetype='application/json')
+
+    # keyset paging: the primary key seeks straight to the page, however deep it is.
+    # One extra row tells whether there is a next page
+    rows = db.session.execute(item_rows(after).limit(limit + 1)).all()
+    next_after: Optional[int] = rows[limit - 1].sourceid if len(rows) > limit else None
+    return jsonify({"items": [item_json(row) for row in rows[:limit]], "next": next_after})
+
+
+# The columns of every item after the sourceid `after`, in sourceid order
+def item_rows(after: int) -> Select:
+    return select(Item.sourceid, Item.name, Item.information).where(Item.sourceid > after).order_by(Item.sourceid)
+
+
+def item_json(row: Row) -> Dict[str, Optional[str]]:
+    return {"name": row.name, "information": row.information}
+
+
+# Every item after `after` as one JSON list, sent a batch at a time. yield_per reads the rows
+# through a server-side cursor, so memory stays flat however big the table is
+def stream_items(after: int) -> Iterator[str]:
+    result = db.session.execute(item_rows(after).execution_options(yield_per=STREAM_BATCH_SIZE))
+    yield "["
+    first = True
+    for batch in result.partitions():
+        # one dumps call per batch, without the brackets of its list
+        chunk = app.json.dumps([item_json(row) for row in batch])[1:-1]
+        yield chunk if first else "," + chunk
+        first = False
+    yield "]"
 
 
 # Describes the model in our postgres database
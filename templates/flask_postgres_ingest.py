@@ -0,0 +1,155 @@
+'''
+Bulk loading of items from NDJSON or CSV, used by POST /items/bulk and `flask load-items`.
+
+On Postgres (psycopg2) the rows are streamed into the table with COPY FROM STDIN: they are
+parsed, turned back into CSV and sent to the server a chunk at a time, so nothing holds the
+whole load in memory. Other databases, such as SQLite in test runs, get batched executemany
+inserts instead. Either way the load is one transaction, a bad row anywhere loads nothing.
+'''
+import csv
+import json
+import time
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import column, insert, table
+from sqlalchemy.engine import Connection
+
+# Columns loaded, in this order, adjust them with the Item model
+COLUMNS = ("name", "information")
+# Rows per executemany batch, and per chunk of CSV text handed to COPY
+BATCH_SIZE = 1000
+
+ItemRow = Tuple[Optional[str], ...]
+
+
+def read_ndjson(lines: Iterable[str]) -> Iterator[ItemRow]:
+    '''
+    one row per JSON object line, blank lines are skipped
+    '''
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as error:
+            raise ValueError(f"line {number}: {error}") from None
+        if not isinstance(item, dict):
+            raise ValueError(f"line {number}: expected a JSON object")
+        yield tuple(none_or_str(item.get(column)) for column in COLUMNS)
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[ItemRow]:
+    '''
+    one row per CSV record, the header names the columns
+    '''
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None or COLUMNS[0] not in reader.fieldnames:
+        raise ValueError(f"the CSV header must name the columns, at least {COLUMNS[0]}")
+    for record in reader:
+        yield tuple(record.get(column) or None for column in COLUMNS)
+
+
+def none_or_str(value: object) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def read_items(stream: Iterable[str], format: str) -> Iterator[ItemRow]:
+    '''
+    rows of NDJSON or CSV text lines, parsed as they are read
+    '''
+    if format not in ("ndjson", "csv"):
+        raise ValueError(f"unknown format {format!r}, use ndjson or csv")
+    return read_csv(stream) if format == "csv" else read_ndjson(stream)
+
+
+def csv_line(row: ItemRow) -> str:
+    '''
+    row in COPY's CSV format: every value quoted, NULL as an unquoted empty field
+    '''
+    return ",".join("" if value is None else '"' + value.replace('"', '""') + '"' for value in row) + "\n"
+
+
+class CsvReader:
+    '''
+    file-like object reading rows as CSV text, what psycopg2's copy_expert consumes
+    '''
+
+    def __init__(self, rows: Iterator[ItemRow]) -> None:
+        self.rows: Optional[Iterator[ItemRow]] = rows
+        self.pending = ""
+        self.count = 0
+        # psycopg2 reports an exception raised in read() as its own QueryCanceled, the parse
+        # error is kept to be raised again once COPY has failed
+        self.error: Optional[ValueError] = None
+
+    def fill(self) -> bool:
+        '''
+        encode the next batch of rows, False once they are all read
+        '''
+        try:
+            batch = list(islice(self.rows, BATCH_SIZE)) if self.rows is not None else []
+        except ValueError as error:
+            self.error = error
+            raise
+        if not batch:
+            self.rows = None
+            return False
+        self.pending += "".join(csv_line(row) for row in batch)
+        self.count += len(batch)
+        return True
+
+    def read(self, size: int = -1) -> str:
+        while (size < 0 or len(self.pending) < size) and self.fill():
+            pass
+        if size < 0:
+            size = len(self.pending)
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+
+def copy_rows(connection: Connection, table_name: str, rows: Iterator[ItemRow]) -> int:
+    '''
+    stream rows into the table with COPY FROM STDIN, return how many were loaded
+    '''
+    reader = CsvReader(rows)
+    dbapi_connection = connection.connection.dbapi_connection
+    assert dbapi_connection is not None
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table_name} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", reader)
+    except Exception:
+        if reader.error is not None:
+            raise reader.error from None
+        raise
+    finally:
+        cursor.close()
+    return reader.count
+
+
+def insert_rows(connection: Connection, table_name: str, rows: Iterator[ItemRow]) -> int:
+    '''
+    insert rows a batch at a time with executemany, return how many were loaded
+    '''
+    statement = insert(table(table_name, *(column(name) for name in COLUMNS)))
+    count = 0
+    while True:
+        batch: List[Dict[str, Optional[str]]] = [dict(zip(COLUMNS, row)) for row in islice(rows, BATCH_SIZE)]
+        if not batch:
+            return count
+        connection.execute(statement, batch)
+        count += len(batch)
+
+
+def load_items(connection: Connection, table_name: str, rows: Iterator[ItemRow]) -> Dict[str, float]:
+    '''
+    load rows into the table within the connection's transaction, with COPY on Postgres.
+    Returns the row count, the seconds it took and the rows per second
+    '''
+    start = time.perf_counter()
+    if connection.dialect.driver == "psycopg2":
+        count = copy_rows(connection, table_name, rows)
+    else:
+        count = insert_rows(connection, table_name, rows)
+    seconds = time.perf_counter() - start
+    return {"rows": count, "seconds": round(seconds, 3), "rows_per_second": round(count / seconds) if seconds else 0}
@@ -0,0 +1,189 @@
+'''
+Request and database latency metrics, served at /metrics in the Prometheus text format.
+
+Everything is kept in memory with the standard library: recording a request or a query is
+a clock read, a bisect into the bucket bounds and a few additions under a lock. Each server
+process keeps its own numbers, so with several workers every scrape reads one worker.
+'''
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, MutableMapping, Tuple
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+    from flask import Flask
+    from sqlalchemy.engine import Connection
+
+# Upper bounds in seconds, from a fast cached response to a slow report
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# ASGI callables, see https://asgi.readthedocs.io
+Message = MutableMapping[str, object]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Message, Receive, Send], Awaitable[None]]
+
+
+class Histogram:
+    '''
+    latency histogram with one series per set of label values
+    '''
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.lock = threading.Lock()
+        # labels -> (bucket counts, then the count of larger values), sum
+        self.series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, seconds: float, **labels: str) -> None:
+        '''
+        record one duration
+        '''
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(BUCKETS, seconds)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = ([0] * (len(BUCKETS) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += seconds
+
+    def render(self) -> List[str]:
+        '''
+        the histogram in the Prometheus text format
+        '''
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = [(key, list(counts), total[0]) for key, (counts, total) in self.series.items()]
+        for key, counts, total in sorted(snapshot):
+            labels = "".join(f'{k}="{escape(v)}",' for k, v in key)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {cumulative}')
+            plain = "{" + labels.rstrip(",") + "}" if labels else ""
+            lines.append(f"{self.name}_sum{plain} {total}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+def escape(value: str) -> str:
+    '''
+    label value escaped for the text format
+    '''
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUESTS = Histogram("http_request_duration_seconds", "Time to handle a request, by method, route and status")
+QUERIES = Histogram("db_query_duration_seconds", "Time to execute a database statement, by statement type")
+
+
+def render() -> str:
+    '''
+    every metric in the Prometheus text format
+    '''
+    return "\n".join(REQUESTS.render() + QUERIES.render()) + "\n"
+
+
+@lru_cache(maxsize=1024)
+def statement_type(statement: str) -> str:
+    '''
+    first keyword of an SQL statement (SELECT, INSERT, ...), cached as engines repeat their statements
+    '''
+    words = statement.split(None, 1)
+    return words[0].upper() if words else "OTHER"
+
+
+def instrument_engine(engine: object) -> None:
+    '''
+    time every statement an SQLAlchemy engine (or async engine) executes
+    '''
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    # statements on a connection run one at a time, so one start time per connection will do
+    def before(conn: "Connection", cursor: object, statement: str, parameters: object, context: object, executemany: bool) -> None:
+        conn.info["query_start"] = time.perf_counter()
+
+    def after(conn: "Connection", cursor: object, statement: str, parameters: object, context: object, executemany: bool) -> None:
+        QUERIES.observe(time.perf_counter() - conn.info["query_start"], statement=statement_type(statement))
+
+    event.listen(sync_engine, "before_cursor_execute", before)
+    event.listen(sync_engine, "after_cursor_execute", after)
+
+
+class RequestTimer:
+    '''
+    ASGI middleware timing every http request, labelled with the route template
+    (/cities/{id}, not /cities/42) so the number of series stays bounded
+    '''
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Message, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = int(str(message["status"]))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUESTS.observe(time.perf_counter() - start, method=str(scope["method"]), route=route, status=str(status))
+
+
+def instrument_fastapi(app: "FastAPI") -> None:
+    '''
+    time the requests of a FastAPI (or Starlette) app and serve /metrics
+    '''
+    from starlette.responses import Response
+
+    async def metrics_endpoint() -> Response:
+        return Response(render(), media_type=CONTENT_TYPE)
+
+    app.add_middleware(RequestTimer)
+    app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+
+def instrument_flask(app: "Flask") -> None:
+    '''
+    time the requests of a Flask app (or the server of a Dash app) and serve /metrics
+    '''
+    from flask import Response, g, request
+
+    def start_timer() -> None:
+        g.metrics_start = time.perf_counter()
+
+    def record(response: Response) -> Response:
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            REQUESTS.observe(time.perf_counter() - start, method=request.method, route=route, status=str(response.status_code))
+        return response
+
+    def metrics_endpoint() -> Response:
+        return Response(render(), content_type=CONTENT_TYPE)
+
+    app.before_request(start_timer)
+    app.after_request(record)
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint)
@@ -0,0 +1,113 @@
+'''
+Local stand-in for PgBouncer, to run the app's pgbouncer profile without installing it:
+
+    python pgbouncer_stub.py --listen 6432 --server localhost:5432 --pool-size 20
+
+Like PgBouncer it accepts any number of app connections but opens at most --pool-size
+connections to Postgres at a time, the other clients wait for one. Unlike it, it never reads
+the Postgres protocol: a client keeps its server connection until it disconnects (session
+pooling). The app opens a connection per request in the pgbouncer profile, so that is one
+request. Use the real PgBouncer (pgbouncer.ini) in production.
+'''
+import argparse
+import asyncio
+from typing import Dict, Optional, Tuple
+
+# Bytes copied at a time in each direction
+CHUNK_SIZE = 65536
+
+
+class Pooler:
+    '''
+    forwards each client connection to the server, with at most `pool_size` open at once
+    '''
+
+    def __init__(self, server: Tuple[str, int], pool_size: int) -> None:
+        self.server = server
+        self.pool_size = pool_size
+        # created on the loop that serves the clients
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.counters = {"clients": 0, "waiting": 0, "active": 0, "most_active": 0}
+
+    async def handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.pool_size)
+        self.counters["clients"] += 1
+        self.counters["waiting"] += 1
+        try:
+            async with self.slots:
+                self.counters["waiting"] -= 1
+                self.counters["active"] += 1
+                self.counters["most_active"] = max(self.counters["most_active"], self.counters["active"])
+                try:
+                    server_reader, server_writer = await asyncio.open_connection(*self.server)
+                    await relay(client_reader, client_writer, server_reader, server_writer)
+                except OSError:
+                    pass
+                finally:
+                    self.counters["active"] -= 1
+        finally:
+            client_writer.close()
+
+    def stats(self) -> Dict[str, int]:
+        '''
+        connections served, waiting for a server connection and holding one
+        '''
+        return dict(self.counters)
+
+
+async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    '''
+    copy bytes until the reader's side closes
+    '''
+    while True:
+        data = await reader.read(CHUNK_SIZE)
+        if not data:
+            return
+        writer.write(data)
+        await writer.drain()
+
+
+async def relay(client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter,
+                server_reader: asyncio.StreamReader, server_writer: asyncio.StreamWriter) -> None:
+    '''
+    copy both ways until either side closes, then close both
+    '''
+    tasks = [asyncio.ensure_future(pipe(client_reader, server_writer)), asyncio.ensure_future(pipe(server_reader, client_writer))]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        server_writer.close()
+        client_writer.close()
+
+
+async def start(listen: Tuple[str, int], server: Tuple[str, int], pool_size: int) -> Tuple[asyncio.AbstractServer, Pooler]:
+    '''
+    listen for app connections, return the listening server and its pooler
+    '''
+    pooler = Pooler(server, pool_size)
+    return await asyncio.start_server(pooler.handle, *listen), pooler
+
+
+async def main(listen: Tuple[str, int], server: Tuple[str, int], pool_size: int) -> None:
+    listener, _ = await start(listen, server, pool_size)
+    print(f"forwarding {listen[0]}:{listen[1]} to {server[0]}:{server[1]}, at most {pool_size} server connections")
+    async with listener:
+        await listener.serve_forever()
+
+
+def address(value: str) -> Tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cap the connections the app opens to Postgres, like PgBouncer")
+    parser.add_argument("--listen", type=address, default=("127.0.0.1", 6432), help="[host:]port to accept app connections on")
+    parser.add_argument("--server", type=address, default=("localhost", 5432), help="host:port of Postgres")
+    parser.add_argument("--pool-size", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.listen, args.server, args.pool_size))
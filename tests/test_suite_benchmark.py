@@ -0,0 +1,114 @@
+import pytest
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import time
+
+from jinja2 import Environment
+
+from src.functions import create_template_env
+from src.render.manifest import MANIFEST_PATH
+from src.flask_app.setup_flask import create_flask
+from src.dash.setup_dash import create_dash
+from src.cicd.githubactions import create_github_actions
+from src.cicd.circleci import create_circleci
+from src.virtual_environment.virtual_environment import create_poetry
+from src.postgres.postgres import create_postgres
+from src.docker.docker import create_docker
+from src.fastapi.setup_fastapi import create_fastapi
+
+# pytest sets cwd as the repository root
+root_path = pathlib.Path().cwd()
+
+SYS_PY = f"{sys.version_info.major}.{sys.version_info.minor}"
+
+# Import-time budget for `pyrepo --help`, override with PYREPO_STARTUP_BUDGET_MS on slow runners
+STARTUP_BUDGET_MS = float(os.getenv('PYREPO_STARTUP_BUDGET_MS', '150'))
+
+# ============================================================= #
+#                         BENCHMARKS                            #
+# ============================================================= #
+# Benchmarks print their timings (run pytest with -s to see them) and assert on
+# behavior that should hold regardless of machine speed
+
+
+def render_full_config() -> float:
+    # Render every component a full `pyrepo config` run can select, minus the virtual environment
+    start = time.perf_counter()
+    create_github_actions(docker=True)
+    create_circleci(docker=True, ecr=True)
+    create_flask(docker=True)
+    create_postgres(pyversion=SYS_PY, docker=True, flask=True)
+    create_fastapi(docker=True, poetry=False)
+    create_dash(app_type='basic', pyversion=SYS_PY, docker=True)
+    create_dash(app_type='gis', pyversion=SYS_PY, docker=True)
+    create_docker(pyversion=SYS_PY)
+    create_poetry(repo='Bench-Repo', maintain='Maintainer', description='Benchmark')
+    return time.perf_counter() - start
+
+
+def test_bench_config_render_cold_vs_warm(monkeypatch):
+    # Cold run compiles every template, warm run (new environment, same on-disk cache) compiles none
+    compiled = []
+    original_compile = Environment.compile
+
+    def counting_compile(self, source, name=None, filename=None, raw=False, defer_init=False):
+        compiled.append(name)
+        return original_compile(self, source, name, filename, raw, defer_init)
+
+    monkeypatch.setattr(Environment, 'compile', counting_compile)
+    requirements = root_path.joinpath('requirements.txt').read_text()
+
+    try:
+        # Without a manifest every output is rendered, even when it is already up to date
+        shutil.rmtree(root_path.joinpath('.pyrepo', 'jinja_cache'), ignore_errors=True)
+        MANIFEST_PATH.unlink(missing_ok=True)
+        create_template_env.cache_clear()
+        cold = render_full_config()
+        cold_compiled = len(compiled)
+
+        # A fresh environment stands in for a new pyrepo process reusing the bytecode cache
+        MANIFEST_PATH.unlink(missing_ok=True)
+        create_template_env.cache_clear()
+        compiled.clear()
+        warm = render_full_config()
+
+        # With the manifest in place nothing changed, so nothing is rendered at all
+        incremental = render_full_config()
+    finally:
+        root_path.joinpath('requirements.txt').write_text(requirements)
+        create_template_env.cache_clear()
+
+    print(f'\nconfig render cold: {cold * 1000:.1f} ms ({cold_compiled} templates compiled)')
+    print(f'config render warm: {warm * 1000:.1f} ms ({len(compiled)} templates compiled)')
+    print(f'config render incremental: {incremental * 1000:.1f} ms')
+
+    assert cold_compiled > 0
+    assert compiled == []
+
+
+def test_bench_help_startup_time():
+    # `pyrepo --help` must stay within the import-time budget and must not load any extension
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'from src.templater import main; main(["--help"])'],
+                            cwd=root_path, capture_output=True, text=True)
+    assert result.returncode == 0
+
+    # -X importtime writes "import time: self [us] | cumulative | imported package" to stderr,
+    # top-level imports are the rows whose package name is not indented
+    total_us = 0
+    imported = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, package = line.split('|')
+        imported.append(package.strip())
+        if not package.startswith('  '):
+            total_us += int(cumulative)
+
+    print(f'\npyrepo --help import time: {total_us / 1000:.1f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)')
+
+    assert 'jinja2' not in imported
+    assert not [name for name in imported if name.startswith('src.') and name != 'src.templater']
+    assert total_us / 1000 < STARTUP_BUDGET_MS
@@ -300,3 +300,47 @@ def test_config_setup_one():
         assert 'Importing basic Dash files...' not in result.output
 
 
+def test_config_plan():
+    # Test pyrepo config --plan prints the plan without writing anything
+    runner = CliRunner()
+
+    output_list = ['Planned files:',
+                    'templates/flask_app.py -> flask/flask_app.py',
+                    'templates/Dockerfile_proj -> Dockerfile',
+                    'flask_requirements.txt, flask_postgres_requirements.txt -> requirements.txt']
+    with runner.isolated_filesystem():
+        result = runner.invoke(main,
+                            ['config',
+                            '--plan',
+                            '--docker',
+                            '--flask',
+                            '--postgres',
+                            '-r','REPO_NAME',
+                            '-m', 'MAINTAINER',
+                            '-d', 'REPO_DESCRIPTION'],
+                            input="\n".join(['N'] * 8))
+
+        assert result.exit_code == 0
+        for output in output_list:
+            assert output in result.output
+        assert 'Settings saved as config.toml' not in result.output
+        # progress messages would read as if files were written
+        assert 'Create flask application...' not in result.output
+        assert 'You have decided to use Docker' not in result.output
+
+
+def test_timings():
+    # Test pyrepo --timings prints a timing table and --timings-json writes the report
+    runner = CliRunner()
+
+    output_list = ['Timings for pyrepo',
+                    'Phase',
+                    'render',
+                    'Total wall time']
+    with runner.isolated_filesystem():
+        result = runner.invoke(main, ['--timings', '--timings-json', 'timings.json', 'easy', 'github-actions'])
+
+        assert result.exit_code == 0
+        for output in output_list:
+            assert output in result.output
+        assert pathlib.Path('timings.json').is_file()
@@ -1,20 +1,30 @@
 import pytest
+import asyncio
 import pathlib
 from configparser import ConfigParser
 import platform
 import os
 import sys
+import json
+import importlib
+from types import SimpleNamespace
 
 from src.flask_app.setup_flask import create_flask
 from src.dash.setup_dash import create_dash
 from src.cicd.githubactions import create_github_actions
 from src.cicd.circleci import create_circleci
-from src.virtual_environment.virtual_environment import create_poetry, create_virtualenv, create_env
+from src.virtual_environment.virtual_environment import create_poetry, create_virtualenv, create_env, install_requirements, pip_install, run_in_env
+from src.virtual_environment import virtual_environment
 from src.postgres.postgres import create_postgres
-from src.docker.docker import create_docker
+from src.docker.docker import create_docker, plan_docker
 from src.templater import easy_setup
 from src.fastapi.setup_fastapi import create_fastapi
 from src.ml.setup_ml import create_automl, create_fullml
+from src.render.plan import new_plan, add_file, add_requirements, describe_plan, render_plan, execute_plan
+from src.render.manifest import load_manifest
+from src.requirements.requirements import merge_requirements, parse_requirement
+from src.timing.timing import TIMINGS, timed, format_timings
+from src.profiling.profiling import compare_profiles, profile_target
 
 # pytest sets cwd as the repository root
 root_path = pathlib.Path().cwd()
@@ -85,6 +95,19 @@ def test_create_flask():
     assert flask_app_path.is_file()
 
 
+def test_create_flask_gunicorn():
+    # The production server config is generated with the chosen worker class, and gevent is added to the requirements
+    create_flask(docker=False, worker_class='gevent')
+
+    config = root_path.joinpath('flask', 'flask_gunicorn.py').read_text()
+    assert 'os.getenv("WORKER_CLASS", "gevent")' in config
+    assert 'preload_app = True' in config
+    assert 'gevent' in root_path.joinpath('requirements.txt').read_text().split()
+
+    create_flask(docker=False)
+    assert 'os.getenv("WORKER_CLASS", "gthread")' in root_path.joinpath('flask', 'flask_gunicorn.py').read_text()
+
+
 def test_create_dash_basic():
     # Test create_dash function
     app_type = 'basic'
@@ -156,7 +179,7 @@ def test_create_postgres():
 
     create_postgres(pyversion, docker, flask)
     
-    flask_postgres_files = ['flask_postgres_README.md', 'flask_postgres.py']
+    flask_postgres_files = ['flask_postgres_README.md', 'flask_postgres.py', 'flask_postgres_ingest.py']
     assert root_path.joinpath('flask').is_dir()
 
     for file in flask_postgres_files:
@@ -164,6 +187,86 @@ def test_create_postgres():
         assert file_path.is_file()
 
 
+def test_create_postgres_pgbouncer():
+    # Test that the pgbouncer profile is generated and that its stand-in caps the server connections
+    create_postgres('3.8', docker=False, flask=True, pgbouncer=True)
+
+    flask_path = root_path.joinpath('flask')
+    assert flask_path.joinpath('pgbouncer.ini').is_file()
+    assert "os.getenv('DB_POOLER', 'pgbouncer')" in flask_path.joinpath('flask_postgres.py').read_text()
+
+    stub_path = flask_path.joinpath('pgbouncer_stub.py')
+    namespace: dict = {}
+    exec(compile(stub_path.read_text(), str(stub_path), 'exec'), namespace)
+
+    async def echo(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(await reader.read(100))
+        await writer.drain()
+        await reader.read()
+        writer.close()
+
+    async def run() -> dict:
+        server = await asyncio.start_server(echo, '127.0.0.1', 0)
+        listener, pooler = await namespace['start'](('127.0.0.1', 0), server.sockets[0].getsockname()[:2], 1)
+        port = listener.sockets[0].getsockname()[1]
+        first = await asyncio.open_connection('127.0.0.1', port)
+        second = await asyncio.open_connection('127.0.0.1', port)
+        for _, writer in [first, second]:
+            writer.write(b'ping')
+        assert await first[0].read(100) == b'ping'
+        # the only server connection is taken, the second client waits for it
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(second[0].read(100), 0.2)
+        first[1].close()
+        assert await asyncio.wait_for(second[0].read(100), 5) == b'ping'
+        second[1].close()
+        stats = pooler.stats()
+        listener.close()
+        server.close()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats['clients'] == 2
+    assert stats['most_active'] == 1
+
+    create_postgres('3.8', docker=False, flask=True)
+    assert "os.getenv('DB_POOLER', '')" in flask_path.joinpath('flask_postgres.py').read_text()
+
+
+def test_postgres_ingest_bad_input():
+    # Test that a bad row fails the bulk load with its parse error, through executemany and through COPY
+    sqlalchemy = pytest.importorskip('sqlalchemy')
+    create_postgres('3.8', docker=False, flask=True)
+    ingest_path = root_path.joinpath('flask', 'flask_postgres_ingest.py')
+    ingest: dict = {}
+    exec(compile(ingest_path.read_text(), str(ingest_path), 'exec'), ingest)
+    lines = ['{"name": "a", "information": "b"}\n', 'not json\n']
+
+    engine = sqlalchemy.create_engine('sqlite://')
+    with engine.connect() as connection:
+        connection.execute(sqlalchemy.text('CREATE TABLE items (name TEXT, information TEXT)'))
+        with pytest.raises(ValueError, match='line 2'):
+            ingest['load_items'](connection, 'items', ingest['read_items'](lines, 'ndjson'))
+
+    class Cursor:
+        # psycopg2 reports an exception raised while reading the file as one of its own errors
+        def copy_expert(self, sql: str, file: object) -> None:
+            try:
+                while file.read(8192):
+                    pass
+            except Exception as error:
+                raise RuntimeError(f'error in .read() call: {error}')
+
+        def close(self) -> None:
+            pass
+
+    connection = SimpleNamespace(connection=SimpleNamespace(dbapi_connection=SimpleNamespace(cursor=Cursor)))
+    with pytest.raises(ValueError, match='line 2'):
+        ingest['copy_rows'](connection, 'items', ingest['read_items'](lines, 'ndjson'))
+    with pytest.raises(ValueError, match='CSV header'):
+        ingest['copy_rows'](connection, 'items', ingest['read_items'](['title\n', 'a\n'], 'csv'))
+
+
 def test_create_docker():
     # Test create_docker function
     pyversion = '3.8'
@@ -174,6 +277,16 @@ def test_create_docker():
     for file in docker_files:
         file_path = root_path.joinpath(file)
         assert file_path.is_file()
+    assert 'CMD [ "bash" ]' in root_path.joinpath('Dockerfile').read_text()
+
+
+def test_create_docker_server():
+    # The container runs the app's production server when there is one
+    create_docker('3.8', server=['gunicorn', '-c', 'fastapi/fastapi_gunicorn.py'])
+
+    dockerfile = root_path.joinpath('Dockerfile').read_text()
+    assert 'CMD ["gunicorn", "-c", "fastapi/fastapi_gunicorn.py"]' in dockerfile
+    assert 'EXPOSE 8000' in dockerfile
 
 
 def test_create_fastapi():
@@ -181,7 +294,7 @@ def test_create_fastapi():
     docker = False
     poetry = False
 
-    fastapi_files = ['fastapi_app.py', 'fastapi_models.py', 'fastapi_database.py']
+    fastapi_files = ['fastapi_app.py', 'fastapi_models.py', 'fastapi_database.py', 'fastapi_crud.py', 'fastapi_loadtest.py', 'fastapi_bulk_benchmark.py', 'fastapi_time.py', 'fastapi_time_stub.py', 'fastapi_jobs.py', 'fastapi_gunicorn.py', 'fastapi_serialization_benchmark.py', 'fastapi_cache.py', 'fastapi_database_config.py', 'fastapi_database_benchmark.py', 'fastapi_search_benchmark.py']
     create_fastapi(docker, poetry)
 
     assert root_path.joinpath('fastapi').is_dir()
@@ -189,4 +302,330 @@ def test_create_fastapi():
     for file in fastapi_files:
         file_path = root_path.joinpath('fastapi', file)
         assert file_path.is_file()
+        compile(file_path.read_text(), str(file_path), 'exec')
+
+
+def test_fastapi_app(tmp_path, monkeypatch):
+    # Test the generated app on SQLite: create in bulk, page through, stream and revalidate a cached page
+    pytest.importorskip('fastapi')
+    pytest.importorskip('httpx')
+    pytest.importorskip('sqlalchemy')
+    from fastapi.testclient import TestClient
+
+    create_fastapi(docker=False, poetry=False)
+    fastapi_path = root_path.joinpath('fastapi')
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path.joinpath('cities.db')}")
+    monkeypatch.delenv('CACHE_URL', raising=False)
+    monkeypatch.delenv('WEB_CONCURRENCY', raising=False)
+    # the app imports the modules next to it by their bare names
+    monkeypatch.syspath_prepend(str(fastapi_path))
+
+    try:
+        app = importlib.import_module('fastapi_app').app
+        with TestClient(app) as client:
+            response = client.post('/cities/bulk', json=[{'name': f'City {i}', 'timezone': 'Europe/Paris'} for i in range(5)])
+            assert response.status_code == 200
+            ids = response.json()['ids']
+            assert len(ids) == 5
+
+            pages = [client.get('/cities', params={'limit': 2}).json()]
+            while pages[-1]['next'] is not None:
+                pages.append(client.get('/cities', params={'limit': 2, 'after': pages[-1]['next']}).json())
+            assert len(pages) == 3
+            assert [city['id'] for page in pages for city in page['items']] == ids
+
+            response = client.get('/cities', params={'stream': 'true', 'limit': 2})
+            assert response.headers['content-type'].startswith('application/x-ndjson')
+            assert [json.loads(line)['id'] for line in response.text.splitlines()] == ids
+
+            etag = client.get('/cities', params={'limit': 2}).headers['etag']
+            response = client.get('/cities', params={'limit': 2}, headers={'If-None-Match': etag})
+            assert response.status_code == 304
+    finally:
+        # drop the generated modules, so later tests import them again from what they render
+        for name, module in list(sys.modules.items()):
+            if str(getattr(module, '__file__', None) or '').startswith(str(fastapi_path)):
+                del sys.modules[name]
+
+
+def test_create_fastapi_async_db():
+    # Test that the async data layer replaces the sync one and brings its driver along
+    create_fastapi(docker=False, poetry=False, async_db=True)
+
+    database = root_path.joinpath('fastapi', 'fastapi_database.py').read_text()
+    assert 'create_async_engine' in database
+    assert 'sqlite+aiosqlite' in root_path.joinpath('fastapi', 'fastapi_database_config.py').read_text()
+    assert 'aiosqlite' in root_path.joinpath('requirements.txt').read_text()
+
+    create_fastapi(docker=False, poetry=False)
+    assert 'create_async_engine' not in root_path.joinpath('fastapi', 'fastapi_database.py').read_text()
+
+
+def test_create_fastapi_database():
+    # Test that --database sets the default DATABASE_URL and adds the matching driver
+    create_fastapi(docker=False, poetry=False, database='postgres')
+
+    config = root_path.joinpath('fastapi', 'fastapi_database_config.py').read_text()
+    assert 'os.getenv("DATABASE_URL", "postgresql+psycopg2://' in config
+    assert 'psycopg2-binary' in root_path.joinpath('requirements.txt').read_text()
+
+    create_fastapi(docker=False, poetry=False, async_db=True, database='postgres')
+    assert 'postgresql+asyncpg://' in root_path.joinpath('fastapi', 'fastapi_database_config.py').read_text()
+    assert 'asyncpg' in root_path.joinpath('requirements.txt').read_text()
+
+    create_fastapi(docker=False, poetry=False)
+    config = root_path.joinpath('fastapi', 'fastapi_database_config.py').read_text()
+    assert 'os.getenv("DATABASE_URL", "sqlite:///./cities.db")' in config
+    assert 'os.getenv("SEARCH_TOKENIZER", "unicode61")' in config
+
+    create_fastapi(docker=False, poetry=False, search_tokenizer='trigram')
+    assert 'os.getenv("SEARCH_TOKENIZER", "trigram")' in root_path.joinpath('fastapi', 'fastapi_database_config.py').read_text()
+
+
+def test_create_metrics():
+    # Test that --metrics adds the metrics module next to the app and that it renders prometheus histograms
+    create_flask(docker=False, metrics=True)
+
+    metrics_path = root_path.joinpath('flask', 'metrics.py')
+    assert metrics_path.is_file()
+
+    namespace: dict = {}
+    exec(compile(metrics_path.read_text(), str(metrics_path), 'exec'), namespace)
+    namespace['REQUESTS'].observe(0.003, method='GET', route='/cities/{id}', status='200')
+    namespace['REQUESTS'].observe(20.0, method='GET', route='/cities/{id}', status='200')
+    text = namespace['render']()
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/cities/{id}",status="200",le="0.005"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/cities/{id}",status="200",le="+Inf"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/cities/{id}",status="200"} 2' in text
+
+
+def test_render_plan():
+    # Test that planning renders nothing and that execute_plan writes every planned file
+    plan = new_plan()
+    output_dir = root_path.joinpath('plan_test')
+    add_file(plan, 'flask_app.py', output_dir.joinpath('flask_app.py'), {'pyversion': SYS_PY})
+    add_file(plan, 'fastapi_home.html', output_dir.joinpath('fastapi_home.html'), {}, copy=True)
+    # Planning the same output twice keeps only the last entry
+    add_file(plan, 'flask_app.py', output_dir.joinpath('flask_app.py'), {'pyversion': SYS_PY})
+    add_requirements(plan, 'flask_requirements.txt')
+    add_requirements(plan, 'flask_requirements.txt')
+
+    assert len(plan.files) == 2
+    assert plan.requirements == ['flask_requirements.txt']
+    assert len(describe_plan(plan)) == 3
+    assert not output_dir.exists()
+
+    outputs = render_plan(plan)
+    # Copied templates keep their own Jinja syntax
+    assert '{% block content %}' in outputs[output_dir.joinpath('fastapi_home.html')]
+    assert 'flask_restful' in outputs[root_path.joinpath('requirements.txt')]
+
+    plan.requirements.clear()
+    execute_plan(plan)
+    for item in plan.files:
+        assert item.output.is_file()
+    # No staged temporary files are left behind
+    assert sorted(path.name for path in output_dir.iterdir()) == ['fastapi_home.html', 'flask_app.py']
+
+
+def test_execute_plan_incremental():
+    # Test that unchanged outputs are skipped and changed or edited outputs are rewritten
+    output_path = root_path.joinpath('plan_test', 'incremental.py')
+    output_path.unlink(missing_ok=True)
+
+    plan = new_plan()
+    add_file(plan, 'flask_app.py', output_path, {'pyversion': SYS_PY})
+    assert execute_plan(plan) == ['plan_test/incremental.py']
+    entry = load_manifest()['plan_test/incremental.py']
+    assert entry['template'] == 'flask_app.py'
+    assert entry['context'] == {'pyversion': SYS_PY}
+
+    mtime = output_path.stat().st_mtime_ns
+    assert execute_plan(plan) == []
+    assert output_path.stat().st_mtime_ns == mtime
+
+    # A new render context or a locally edited output is rendered again
+    plan = new_plan()
+    add_file(plan, 'flask_app.py', output_path, {'pyversion': '3.0'})
+    assert execute_plan(plan) == ['plan_test/incremental.py']
+    output_path.write_text('edited')
+    assert execute_plan(plan) == ['plan_test/incremental.py']
+    assert output_path.read_text() != 'edited'
 
+
+def test_parse_requirement():
+    # Test parsing of names, extras, specifiers and markers
+    requirement = parse_requirement('Flask_RESTful[auth] >=0.3, <1.0 ; python_version >= "3.8"  # api')
+    assert requirement.key == 'flask-restful'
+    assert requirement.extras == ('auth',)
+    assert requirement.specifiers == ('>=0.3', '<1.0')
+    assert requirement.marker == 'python_version >= "3.8"'
+
+    for line in ['', '# comment', '-r other.txt']:
+        assert parse_requirement(line) is None
+
+
+def test_merge_requirements():
+    # Test that requirements are deduplicated across files and conflicts are reported
+    root = 'wheel\npytest[mypy]\nstarlette==0.13.6\n'
+    component = 'Wheel\npytest[cov]>=6\nstarlette>=0.20\nflask_restful\nflask-restful\n'
+
+    lines, conflicts = merge_requirements([('requirements.txt', root), ('fastapi_requirements.txt', component)])
+
+    assert lines == ['wheel', 'pytest[cov,mypy]>=6', 'starlette==0.13.6', 'flask_restful']
+    assert len(conflicts) == 1
+    assert 'starlette>=0.20 (fastapi_requirements.txt)' in conflicts[0]
+
+
+def test_merge_requirements_range_conflicts():
+    # Test that ranges with no version in common and direct references with specifiers are reported, not merged
+    lines, conflicts = merge_requirements([('a.txt', 'sqlalchemy<2\nfoo>=1\nbar~=1.4\n'), ('b.txt', 'sqlalchemy>=2.0\nfoo @ https://x/foo.whl\nbar<2\n')])
+
+    assert lines == ['sqlalchemy<2', 'foo>=1', 'bar~=1.4,<2']
+    assert len(conflicts) == 2
+    assert 'no version is >=2.0 and <2' in conflicts[0]
+    assert 'direct reference' in conflicts[1]
+
+
+def test_parse_requirement_paths_and_urls():
+    # Test that paths, archives and VCS urls name no project, and direct references keep their url
+    for line in ['./local/pkg', '.', 'dist/pkg-1.0-py3-none-any.whl', 'pkg-1.0.tar.gz', 'git+https://github.com/a/x.git']:
+        assert parse_requirement(line) is None
+
+    requirement = parse_requirement('foo[cli] @ https://x/foo.whl ; python_version >= "3.8"')
+    assert requirement.key == 'foo'
+    assert requirement.url == 'https://x/foo.whl'
+    assert requirement.specifiers == ()
+
+
+def test_merge_requirements_paths_and_urls():
+    # Test that path, VCS and direct reference lines are passed through as written, once each
+    root = './local/pkg\ngit+https://github.com/a/x.git#egg=x\nfoo @ https://x/foo.whl\nwheel\n'
+    component = './local/pkg\ngit+https://github.com/b/y.git\nfoo @ https://x/foo.whl\nfoo\nbar @ git+https://github.com/c/bar.git\n'
+
+    lines, conflicts = merge_requirements([('requirements.txt', root), ('ml_requirements.txt', component)])
+
+    assert lines == ['./local/pkg', 'git+https://github.com/a/x.git#egg=x', 'foo @ https://x/foo.whl', 'wheel',
+                     'git+https://github.com/b/y.git', 'bar @ git+https://github.com/c/bar.git']
+    assert conflicts == []
+
+    lines, conflicts = merge_requirements([('a.txt', 'foo @ https://x/foo-1.whl\n'), ('b.txt', 'foo @ https://x/foo-2.whl\n')])
+    assert lines == ['foo @ https://x/foo-1.whl']
+    assert 'different direct references' in conflicts[0]
+
+
+def test_install_requirements_fingerprint(monkeypatch):
+    # Test that pip only runs when requirements.txt changed since the last install
+    installs = []
+
+    def fake_pip_install(requirements_file):
+        installs.append(root_path.joinpath(requirements_file).read_text().split())
+        return 0
+
+    monkeypatch.setattr(virtual_environment, 'pip_install', fake_pip_install)
+    root_path.joinpath('env').mkdir(exist_ok=True)
+    root_path.joinpath('env', 'pyrepo_requirements.json').unlink(missing_ok=True)
+    requirements = root_path.joinpath('requirements.txt').read_text()
+
+    try:
+        root_path.joinpath('requirements.txt').write_text('numpy\ncerberus\n')
+        install_requirements()
+        assert installs == [['numpy', 'cerberus']]
+
+        # Same requirements in a different order, with comments and blank lines, nothing to install
+        root_path.joinpath('requirements.txt').write_text('# packages\ncerberus\n\nnumpy  # arrays\n')
+        install_requirements()
+        assert len(installs) == 1
+
+        # Changed and added requirements are installed together with the ones already installed
+        root_path.joinpath('requirements.txt').write_text('cerberus\nnumpy>=1.0\nwheel\n')
+        install_requirements()
+        assert installs[-1] == ['cerberus', 'numpy>=1.0', 'wheel']
+
+        # Lines that name no project are part of the fingerprint too
+        root_path.joinpath('requirements.txt').write_text('cerberus\nnumpy>=1.0\nwheel\n./local/pkg\n')
+        install_requirements()
+        assert len(installs) == 3
+    finally:
+        root_path.joinpath('requirements.txt').write_text(requirements)
+        root_path.joinpath('env', 'pyrepo_requirements.json').unlink(missing_ok=True)
+
+
+def test_install_requirements_failure(monkeypatch):
+    # Test that a failed pip install is reported in the exit status and installed again on the next run
+    monkeypatch.setattr(virtual_environment, 'pip_install', lambda requirements_file: 2)
+    monkeypatch.setattr(virtual_environment, 'create_env', lambda pyversion, exec_path: None)
+    root_path.joinpath('env').mkdir(exist_ok=True)
+    root_path.joinpath('env', 'pyrepo_requirements.json').unlink(missing_ok=True)
+
+    assert install_requirements() == 2
+    assert not root_path.joinpath('env', 'pyrepo_requirements.json').exists()
+    with pytest.raises(SystemExit) as exit:
+        create_virtualenv(SYS_PY)
+    assert exit.value.code == 2
+
+
+def test_wheelhouse_offline_install(monkeypatch):
+    # Test that pip and the Dockerfile install from a filled wheelhouse without index access
+    commands = []
+    monkeypatch.setattr(virtual_environment, 'run_in_env', lambda args: commands.append(' '.join(args)) or 0)
+    wheelhouse_path = root_path.joinpath('wheelhouse')
+    wheelhouse_path.mkdir(exist_ok=True)
+    wheel = wheelhouse_path.joinpath('placeholder-0.1-py3-none-any.whl')
+    wheel.touch()
+
+    try:
+        pip_install('requirements.txt')
+        plan = new_plan()
+        plan_docker(plan, pyversion=SYS_PY)
+        dockerfile = render_plan(plan)[root_path.joinpath('Dockerfile')]
+    finally:
+        wheel.unlink()
+        wheelhouse_path.rmdir()
+
+    assert '--no-index --find-links wheelhouse -r requirements.txt' in commands[0]
+    assert 'pip install --no-index --find-links=/app/wheelhouse -r requirements.txt' in dockerfile
+    # wheels built on another platform than the image's fall back to the index
+    assert '|| pip install --find-links=/app/wheelhouse -r requirements.txt' in dockerfile
+
+
+def test_run_in_env():
+    # Test that commands run directly in the environment and report their own exit status
+    assert run_in_env(['python', '-c', 'import sys; sys.exit(sys.prefix == sys.base_prefix)']) == 0
+    assert run_in_env(['python', '-c', 'import sys; sys.exit(3)']) == 3
+    assert run_in_env(['no-such-command']) == 127
+
+
+def test_timed():
+    # Test that timed phases are recorded and laid out slowest first
+    TIMINGS.clear()
+    with timed('render', 'fast.py'):
+        pass
+    with timed('pip install', 'requirements.txt'):
+        sum(range(100000))
+
+    assert [x.phase for x in TIMINGS] == ['render', 'pip install']
+    lines = format_timings(TIMINGS)
+    assert lines[0].split() == ['Phase', 'Component', 'Seconds']
+    assert lines[2].startswith('pip install')
+    TIMINGS.clear()
+
+
+def test_profile_target():
+    # Test that a script is profiled into HTML and JSON reports and that two reports can be compared
+    script = root_path.joinpath('profile_example.py')
+    script.write_text('def busy():\n    return sum(i * i for i in range(200000))\n\nbusy()\n')
+
+    json_path = profile_target('profile_example.py', 'cprofile', None)
+    report = json.loads(json_path.read_text())
+    assert json_path.with_suffix('.html').exists()
+    assert report['profiler'] == 'cprofile'
+    assert any(x['function'] == 'profile_example.py:1(busy)' for x in report['functions'])
+
+    lines = compare_profiles(str(json_path), str(json_path), top=5)
+    assert lines[0].split() == ['Function', 'Before', 'After', 'Change']
+    assert lines[-1].endswith('+0.000')
+
+    script.unlink()
+    for x in json_path.parent.glob(f'{json_path.stem}.*'):
+        x.unlink()